@@ -1,9 +1,8 @@
 """ContextDiff — Sankey diff view comparing before/after context traces."""
 
 import html
-from collections import defaultdict
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 from context_engineering_dashboard.core.trace import ComponentType, ContextTrace
 from context_engineering_dashboard.styles.colors import (
@@ -12,6 +11,23 @@ from context_engineering_dashboard.styles.colors import (
     UNUSED_COLOR,
 )
 
+_CONTAINER_OPEN = (
+    '<div class="ced-sankey-container" style="border:3px solid black;padding:16px;'
+    "font-family:'JetBrains Mono','IBM Plex Mono','Consolas',monospace;\">"
+)
+_CONTAINER_CLOSE = "</div>"
+
+# Rendered in place of the Sankey when before and after have identical per-type totals
+_NO_CHANGE_SVG = (
+    '<svg width="100%" height="80" viewBox="0 0 800 80">'
+    '<rect x="20" y="10" width="760" height="60" fill="white" stroke="black" '
+    'stroke-width="3" stroke-dasharray="8,4"/>'
+    '<text x="400" y="40" text-anchor="middle" dominant-baseline="middle" '
+    'font-family="monospace" font-size="12" font-weight="bold" fill="#888">'
+    "NO CHANGES</text>"
+    "</svg>"
+)
+
 
 @dataclass
 class ContextDiff:
@@ -47,12 +63,7 @@ class ContextDiff:
 
     def summary(self) -> None:
         """Print a text summary of changes."""
-        before_groups = self._group_by_type(self.before)
-        after_groups = self._group_by_type(self.after)
-        all_types = sorted(
-            set(before_groups.keys()) | set(after_groups.keys()),
-            key=lambda t: t.value,
-        )
+        before_groups, after_groups, all_types = self._groups()
 
         lines = []
         lines.append(f"{'Component':<20} {'Before':>10} {'After':>10} {'Change':>10}")
@@ -76,25 +87,52 @@ class ContextDiff:
 
         print("\n".join(lines))
 
+    def _groups(
+        self,
+    ) -> Tuple[Dict[ComponentType, int], Dict[ComponentType, int], List[ComponentType]]:
+        """Per-type token totals for both traces and the sorted union of types.
+
+        Computed on each call, so in-place edits to either trace always show.
+        """
+        before_groups = self._group_by_type(self.before)
+        after_groups = self._group_by_type(self.after)
+        all_types = sorted(before_groups.keys() | after_groups.keys(), key=lambda t: t.value)
+        return before_groups, after_groups, all_types
+
     def _group_by_type(self, trace: ContextTrace) -> Dict[ComponentType, int]:
-        groups: Dict[ComponentType, int] = defaultdict(int)
+        groups: Dict[ComponentType, int] = {}
         for comp in trace.components:
-            groups[comp.type] += comp.token_count
-        return dict(groups)
+            groups[comp.type] = groups.get(comp.type, 0) + comp.token_count
+        return groups
 
     def _render_html(self) -> str:
-        before_groups = self._group_by_type(self.before)
-        after_groups = self._group_by_type(self.after)
-        all_types = sorted(
-            set(before_groups.keys()) | set(after_groups.keys()),
-            key=lambda t: t.value,
-        )
+        before_groups, after_groups, all_types = self._groups()
 
         total_b = self.before.total_tokens
         total_a = self.after.total_tokens
         saved = total_b - total_a
         pct_saved = f"{saved / total_b * 100:.1f}" if total_b > 0 else "0"
 
+        header = (
+            f'<div style="display:flex;justify-content:space-between;margin-bottom:16px;'
+            f"font-family:'JetBrains Mono',monospace;font-size:12px;font-weight:700;"
+            f'text-transform:uppercase;">'
+            f"<span>{html.escape(self.before_label)}: {total_b:,} tokens</span>"
+            f"<span>{html.escape(self.after_label)}: {total_a:,} tokens "
+            f"({pct_saved}% saved)</span>"
+            f"</div>"
+        )
+
+        # Nothing changed: skip the layout and path math entirely
+        if total_b == total_a and before_groups == after_groups:
+            return "".join((_CONTAINER_OPEN, header, _NO_CHANGE_SVG, _CONTAINER_CLOSE))
+
+        # (upper-cased label, color) per type, looked up once per render
+        type_info = {
+            ct: (COMPONENT_LABELS.get(ct, ct.value).upper(), COMPONENT_COLORS.get(ct, "#999999"))
+            for ct in all_types
+        }
+
         # Layout constants
         svg_w = 800
         col_w = 150
@@ -120,12 +158,12 @@ class ContextDiff:
 
         # Build before rects
         before_rects = self._build_rects(
-            before_groups, all_types, total_b, left_x, col_w, usable_h, gap
+            before_groups, all_types, type_info, total_b, left_x, col_w, usable_h, gap
         )
         # Build after rects (include unused/freed space)
         after_types = list(all_types)
         after_rects = self._build_rects(
-            after_groups, after_types, total_b, right_x, col_w, usable_h, gap
+            after_groups, after_types, type_info, total_b, right_x, col_w, usable_h, gap
         )
 
         # Add waste/freed node if saved > 0
@@ -165,40 +203,24 @@ class ContextDiff:
 
         # Before rects
         for r in before_rects:
-            svg_parts.append(self._rect_svg(r))
+            self._rect_svg_into(svg_parts, r)
 
         # After rects
         for r in after_rects:
-            svg_parts.append(self._rect_svg(r, show_change=True, before_groups=before_groups))
+            self._rect_svg_into(svg_parts, r, show_change=True, before_groups=before_groups)
 
         # Flow paths
-        svg_parts.extend(self._flow_paths(before_rects, after_rects, all_types))
+        self._flow_paths_into(svg_parts, before_rects, after_rects, all_types, type_info)
 
         svg_parts.append("</svg>")
 
-        # Wrap in container
-        header = (
-            f'<div style="display:flex;justify-content:space-between;margin-bottom:16px;'
-            f"font-family:'JetBrains Mono',monospace;font-size:12px;font-weight:700;"
-            f'text-transform:uppercase;">'
-            f"<span>{html.escape(self.before_label)}: {total_b:,} tokens</span>"
-            f"<span>{html.escape(self.after_label)}: {total_a:,} tokens "
-            f"({pct_saved}% saved)</span>"
-            f"</div>"
-        )
-
-        return (
-            f'<div class="ced-sankey-container" style="border:3px solid black;padding:16px;'
-            f"font-family:'JetBrains Mono','IBM Plex Mono','Consolas',monospace;\">"
-            f"{header}"
-            f'{"".join(svg_parts)}'
-            f"</div>"
-        )
+        return "".join([_CONTAINER_OPEN, header, *svg_parts, _CONTAINER_CLOSE])
 
     def _build_rects(
         self,
         groups: Dict[ComponentType, int],
         types: List[ComponentType],
+        type_info: Dict[ComponentType, Tuple[str, str]],
         total: int,
         x: float,
         w: float,
@@ -207,18 +229,15 @@ class ContextDiff:
     ) -> list:
         rects = []
         y = 20.0
-        # Count visible components to calculate available height for bars (excluding gaps)
-        visible_count = sum(1 for ct in types if groups.get(ct, 0) > 0)
-        total_gaps = gap * (visible_count - 1) if visible_count > 1 else 0
+        # Visible (type, tokens) pairs, gathered in one pass over the groups
+        visible = [(ct, groups[ct]) for ct in types if groups.get(ct, 0) > 0]
+        total_gaps = gap * (len(visible) - 1) if len(visible) > 1 else 0
         bars_h = usable_h - total_gaps  # Height available for actual bars
+        scale = bars_h / total if total > 0 else 0.0
 
-        for ct in types:
-            tokens = groups.get(ct, 0)
-            if tokens <= 0:
-                continue
-            h = max(tokens / total * bars_h, 15) if total > 0 else 15
-            color = COMPONENT_COLORS.get(ct, "#999999")
-            label = COMPONENT_LABELS.get(ct, ct.value).upper()
+        for ct, tokens in visible:
+            h = max(tokens * scale, 15) if total > 0 else 15
+            label, color = type_info[ct]
             rects.append(
                 {
                     "type": ct,
@@ -235,16 +254,19 @@ class ContextDiff:
             y += h + gap
         return rects
 
-    def _rect_svg(
+    def _rect_svg_into(
         self,
+        out: List[str],
         r: dict,
         show_change: bool = False,
         before_groups: Dict[ComponentType, int] | None = None,
-    ) -> str:
+    ) -> None:
+        """Append the SVG elements for one rect (plus badges) to out."""
         stroke_dash = ' stroke-dasharray="8,4"' if r.get("is_waste") else ""
         text_color = "#888" if r.get("is_waste") else "black"
 
-        # Token label
+        # Token label. Labels come from COMPONENT_LABELS / ComponentType values (or
+        # the fixed "UNUSED" waste label) plus integers, so they need no escaping.
         tok_label = r["label"]
         if r["tokens"] >= 1000:
             tok_label += f" {r['tokens'] // 1000}K"
@@ -254,13 +276,15 @@ class ContextDiff:
         cx = r["x"] + r["w"] / 2
         cy = r["y"] + r["h"] / 2
 
-        parts = [
+        out.append(
             f'<rect x="{r["x"]}" y="{r["y"]}" width="{r["w"]}" height="{r["h"]}" '
-            f'fill="{r["color"]}" stroke="black" stroke-width="3"{stroke_dash}/>',
+            f'fill="{r["color"]}" stroke="black" stroke-width="3"{stroke_dash}/>'
+        )
+        out.append(
             f'<text x="{cx}" y="{cy}" text-anchor="middle" dominant-baseline="middle" '
             f'font-family="monospace" font-size="11" font-weight="bold" '
-            f'fill="{text_color}">{html.escape(tok_label)}</text>',
-        ]
+            f'fill="{text_color}">{tok_label}</text>'
+        )
 
         # Change percentage badge
         if show_change and before_groups and r["type"] is not None and not r.get("is_waste"):
@@ -270,7 +294,7 @@ class ContextDiff:
                 if abs(change) > 0.5:
                     change_str = f"{change:+.0f}%"
                     change_color = "#00AA55" if change < 0 else "#CC0000"
-                    parts.append(
+                    out.append(
                         f'<text x="{cx}" y="{cy + 12}" text-anchor="middle" '
                         f'font-family="monospace" font-size="9" '
                         f'fill="{change_color}">{change_str}</text>'
@@ -281,39 +305,47 @@ class ContextDiff:
             freed_str = (
                 f"+{r['tokens'] // 1000}K freed" if r["tokens"] >= 1000 else f"+{r['tokens']} freed"
             )
-            parts.append(
+            out.append(
                 f'<text x="{cx}" y="{cy + 14}" text-anchor="middle" '
                 f'font-family="monospace" font-size="10" fill="#888">'
-                f"{html.escape(freed_str)}</text>"
+                f"{freed_str}</text>"
             )
 
-        return "\n".join(parts)
-
-    def _flow_paths(
+    def _flow_paths_into(
         self,
+        out: List[str],
         before_rects: list,
         after_rects: list,
         all_types: List[ComponentType],
-    ) -> List[str]:
-        paths = []
+        type_info: Dict[ComponentType, Tuple[str, str]],
+    ) -> None:
+        """Append a flow path for every type present in both columns to out."""
+        if not before_rects or not after_rects:
+            return
         before_map = {r["type"]: r for r in before_rects if r["type"] is not None}
         after_map = {r["type"]: r for r in after_rects if r["type"] is not None}
 
+        # Every rect in a column shares x and w, so the horizontal control points
+        # are the same for all flows; bake them into the path template once.
+        x1 = before_rects[0]["x"] + before_rects[0]["w"]
+        x2 = after_rects[0]["x"]
+        mx = (x1 + x2) / 2
+        path_tpl = (
+            f'<path d="M{x1},{{y1}} C{mx},{{y1}} {mx},{{y2}} {x2},{{y2}}" '
+            f'fill="none" stroke="{{color}}" stroke-width="{{sw:.0f}}" '
+            f'opacity="0.6"/>'
+        ).format
+
         for ct in all_types:
             if ct not in before_map or ct not in after_map:
                 continue
             br = before_map[ct]
             ar = after_map[ct]
-            x1 = br["x"] + br["w"]
-            y1 = br["y"] + br["h"] / 2
-            x2 = ar["x"]
-            y2 = ar["y"] + ar["h"] / 2
-            mx = (x1 + x2) / 2
-            stroke_w = max(min(br["h"], ar["h"]) * 0.8, 5)
-            color = COMPONENT_COLORS.get(ct, "#999")
-            paths.append(
-                f'<path d="M{x1},{y1} C{mx},{y1} {mx},{y2} {x2},{y2}" '
-                f'fill="none" stroke="{color}" stroke-width="{stroke_w:.0f}" '
-                f'opacity="0.6"/>'
+            out.append(
+                path_tpl(
+                    y1=br["y"] + br["h"] / 2,
+                    y2=ar["y"] + ar["h"] / 2,
+                    color=type_info[ct][1],
+                    sw=max(min(br["h"], ar["h"]) * 0.8, 5),
+                )
             )
-        return paths
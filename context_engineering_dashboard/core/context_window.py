@@ -1,12 +1,24 @@
 """ContextBuilder — main Jupyter widget for building and visualizing LLM context windows."""
 
 import copy
+import dataclasses
+import functools
+import hashlib
 import html
 import json
+import math
 import uuid
-from typing import TYPE_CHECKING, List, Optional
-
-from context_engineering_dashboard.core.trace import ComponentType, ContextComponent, ContextTrace
+from typing import TYPE_CHECKING, Any, List, Optional
+
+from context_engineering_dashboard.core.resource import count_tokens
+from context_engineering_dashboard.core.trace import (
+    ComponentType,
+    ContextComponent,
+    ContextTrace,
+    EmbeddingTrace,
+    ToolCall,
+    Trace,
+)
 from context_engineering_dashboard.layouts.vertical import compute_vertical_layout
 from context_engineering_dashboard.styles.colors import (
     COMPONENT_COLORS,
@@ -18,297 +30,260 @@ from context_engineering_dashboard.styles.colors import (
     UNUSED_TEXT_COLOR,
 )
 
-if TYPE_CHECKING:
-    from context_engineering_dashboard.core.resource import ContextResource
-
+try:
+    import orjson
 
-class ContextBuilder:
-    """Stateful editor for building and visualizing LLM context windows.
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
 
-    ContextBuilder provides:
-    - Neo-brutalist visualization in Jupyter notebooks
-    - Two-panel view with Available resources and Context Builder
-    - Drag-and-drop between panels to select/deselect items
-    - In-browser editing with Save button persistence
-    - Export of modified traces
+if TYPE_CHECKING:
+    from context_engineering_dashboard.core.resource import ContextResource
 
-    Parameters
-    ----------
-    trace : ContextTrace, optional
-        The trace data to visualize. Can be None if only using resources.
-    context_limit : int
-        Maximum context window size in tokens.
-    layout : str
-        Layout algorithm: "vertical" (default).
-    resources : List[ContextResource], optional
-        Resource pools to show in Available panel.
 
-    Interactions
-    ------------
-    - Hover: Tooltip with component type and token count
-    - Click: Modal with full content and metadata
-    - Click on text in modal: Switch to edit mode with Save button
-    - Drag items: Move between Available and Context panels
+def _copy_trace(trace: ContextTrace) -> ContextTrace:
+    """Copy a trace so that edits to the copy never reach the source.
 
-    Examples
-    --------
-    >>> rag = ContextResource.from_chroma(collection, ResourceType.RAG)
-    >>> rag.query(query_texts=["How do I..."], n_results=10)
-    >>> rag.select(["doc_1", "doc_2"])
-    >>>
-    >>> builder = ContextBuilder(resources=[rag])
-    >>> builder.display()
-    >>> # After dragging items and clicking Save...
-    >>> builder.apply_selections()
-    >>> new_trace = builder.get_trace()
+    Component objects and their metadata dicts, the LLM call trace
+    (messages, tool calls, usage), embedding traces and the list containers
+    are copied; strings are immutable and shared. This avoids
+    ``copy.deepcopy`` over the whole tree, which walks every string and keeps
+    a memo dict for it.
     """
-
-    def __init__(
-        self,
-        trace: Optional[ContextTrace] = None,
-        context_limit: int = 128_000,
-        layout: str = "vertical",
-        resources: Optional[List["ContextResource"]] = None,
-    ) -> None:
-        # Initialize trace (create empty if not provided)
-        if trace is None:
-            trace = ContextTrace(
-                context_limit=context_limit,
-                components=[],
-                total_tokens=0,
+    return dataclasses.replace(
+        trace,
+        components=[
+            ContextComponent(
+                id=c.id,
+                type=c.type,
+                content=c.content,
+                token_count=c.token_count,
+                metadata=dict(c.metadata),
             )
-        self._original_trace = trace  # Immutable reference
-        self._working_trace = copy.deepcopy(trace)  # Mutable copy for edits
-        self._edits: dict = {}  # Track edit history
-        self._reorder: Optional[List[str]] = None  # Track reorder history
-        self.context_limit = context_limit or trace.context_limit
-        self.layout = layout.lower()
-        self._resources = resources or []
-        self._uid = uuid.uuid4().hex[:12]
-        self._pending_selections: dict = {}  # Track pending selection changes
-
-    @property
-    def trace(self) -> ContextTrace:
-        """Return the working trace (for backward compatibility)."""
-        return self._working_trace
-
-    def get_trace(self) -> ContextTrace:
-        """Return a deep copy of the current working trace.
-
-        Returns
-        -------
-        ContextTrace
-            A new ContextTrace object with all current edits applied.
-        """
-        return copy.deepcopy(self._working_trace)
-
-    def apply_edit(self, component_id: str, new_content: str) -> None:
-        """Edit a component's content and recount tokens.
-
-        Parameters
-        ----------
-        component_id : str
-            The ID of the component to edit.
-        new_content : str
-            The new content for the component.
-
-        Raises
-        ------
-        KeyError
-            If the component_id is not found.
-        """
-        for comp in self._working_trace.components:
-            if comp.id == component_id:
-                old_content = comp.content
-                old_tokens = comp.token_count
-                new_tokens = self._count_tokens(new_content)
-
-                # Update component
-                # Create new component with updated values (dataclass is immutable)
-                idx = self._working_trace.components.index(comp)
-                self._working_trace.components[idx] = ContextComponent(
-                    id=comp.id,
-                    type=comp.type,
-                    content=new_content,
-                    token_count=new_tokens,
-                    metadata=comp.metadata,
-                )
-
-                # Update total tokens
-                self._working_trace.total_tokens += new_tokens - old_tokens
-
-                # Track edit
-                self._edits[component_id] = {
-                    "original": old_content,
-                    "edited": new_content,
-                    "original_tokens": old_tokens,
-                    "new_tokens": new_tokens,
-                }
-                return
-
-        raise KeyError(f"Component '{component_id}' not found")
-
-    def apply_reorder(self, new_order: List[str]) -> None:
-        """Reorder components according to the given order.
-
-        Parameters
-        ----------
-        new_order : List[str]
-            List of component IDs in the desired order.
-        """
-        # Build a map of id -> component
-        comp_map = {c.id: c for c in self._working_trace.components}
-
-        # Reorder components
-        reordered = []
-        for comp_id in new_order:
-            if comp_id in comp_map:
-                reordered.append(comp_map[comp_id])
-
-        # Add any components not in new_order (shouldn't happen, but be safe)
-        for comp in self._working_trace.components:
-            if comp.id not in new_order:
-                reordered.append(comp)
-
-        self._working_trace.components = reordered
-        self._reorder = new_order
-
-    def reset(self) -> None:
-        """Reset to the original trace, discarding all edits."""
-        self._working_trace = copy.deepcopy(self._original_trace)
-        self._edits = {}
-        self._reorder = None
-
-    def has_changes(self) -> bool:
-        """Check if any edits have been made.
-
-        Returns
-        -------
-        bool
-            True if the trace has been modified.
-        """
-        return bool(self._edits) or self._reorder is not None
-
-    def to_json(self, path: str) -> None:
-        """Save the working trace to a JSON file.
-
-        Parameters
-        ----------
-        path : str
-            File path to save to.
-        """
-        self._working_trace.to_json(path)
-
-    def _count_tokens(self, content: str) -> int:
-        """Count tokens in content using tiktoken."""
-        try:
-            import tiktoken
-
-            encoding = tiktoken.get_encoding("cl100k_base")
-            return len(encoding.encode(content))
-        except Exception:
-            # Fallback: rough estimate
-            return len(content) // 4
+            for c in trace.components
+        ],
+        trace=None if trace.trace is None else _copy_call_trace(trace.trace),
+        embedding_traces=[
+            EmbeddingTrace(
+                provider=e.provider,
+                model=e.model,
+                input_text=e.input_text,
+                embedding=e.embedding.copy(),
+                latency_ms=e.latency_ms,
+            )
+            for e in trace.embedding_traces
+        ],
+        tags=list(trace.tags),
+    )
+
+
+def _copy_call_trace(trace: Trace) -> Trace:
+    """Copy an LLM call trace; tool-call arguments may nest, so they are deep-copied."""
+    return dataclasses.replace(
+        trace,
+        messages=[dict(m) for m in trace.messages],
+        tool_calls=[
+            ToolCall(name=t.name, arguments=copy.deepcopy(t.arguments), result=t.result)
+            for t in trace.tool_calls
+        ],
+        usage=dict(trace.usage),
+    )
+
+
+# (css class, icon, escaped label, colour) per component type. The palette is
+# fixed, so this is resolved (and escaped) once at import instead of per item.
+_COMPONENT_RENDER = {
+    ct: (
+        CSS_CLASSES.get(ct, ""),
+        COMPONENT_ICONS.get(ct, ""),
+        html.escape(COMPONENT_LABELS.get(ct, "")),
+        COMPONENT_COLORS.get(ct, "#999"),
+    )
+    for ct in ComponentType
+}
+_NO_RENDER = ("", "", "", "#999")
+
+# Markup templates, filled with %-formatting against pre-escaped values
+_LEGEND_ITEM_TMPL = (
+    '<div class="ced-legend-item">'
+    '<div class="ced-legend-swatch%s" style="background:%s;"></div>'
+    '<span class="ced-legend-label">%s</span>'
+    "</div>"
+)
+_LEGEND_ROWS = tuple(
+    _LEGEND_ITEM_TMPL % ("", _COMPONENT_RENDER[ct][3], _COMPONENT_RENDER[ct][2])
+    for ct in ComponentType
+) + (_LEGEND_ITEM_TMPL % (" ced-dashed", UNUSED_COLOR, "Unused"),)
+# The legend does not depend on the instance at all
+_LEGEND_HTML = '<div class="ced-legend">' + "".join(_LEGEND_ROWS) + "</div>"
+
+_HEADER_HTML = (
+    '<div class="ced-header">'
+    '<span class="ced-title">Context Builder</span>'
+    '<div class="ced-controls">'
+    '<button class="ced-btn">\u2699</button>'
+    "</div>"
+    "</div>"
+)
 
-    @property
-    def resources(self) -> List["ContextResource"]:
-        """Return the list of resources."""
-        return self._resources
+# Widget wrapper around the body: container, stylesheet and header before it;
+# legend, tooltip, modal, data and script after it. Joined with "\n" like the
+# body fragments.
+_SHELL_HEAD_TMPL = '<div id="ced-%s" class="ced-container">\n<style>%s</style>\n' + (
+    _HEADER_HTML.replace("%", "%%")
+)
+_SHELL_TAIL_TMPL = (
+    _LEGEND_HTML.replace("%", "%%")
+    + '\n<div id="ced-tooltip-%s" class="ced-tooltip" style="display:none;"></div>'
+    "\n%s\n%s\n<script>%s</script>\n</div>"
+)
 
-    def apply_selections(self, selections: Optional[dict] = None) -> None:
-        """Apply selection changes from browser to resources.
+_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, allow_nan=False)
 
-        This method updates each resource's selected_ids based on
-        the selections made via drag-and-drop in the browser.
 
-        Parameters
-        ----------
-        selections : dict, optional
-            Dict mapping resource_name -> list of selected item IDs.
-            If not provided, uses pending selections from _pending_selections.
-        """
-        if selections is None:
-            selections = self._pending_selections
+def _finite(obj: Any) -> Any:
+    """Return ``obj`` with NaN and infinite floats (at any depth) replaced by None."""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    return obj
 
-        for resource in self._resources:
-            if resource.name in selections:
-                resource.selected_ids = set(selections[resource.name])
 
-        # Rebuild components from selected resource items
-        self._rebuild_components_from_resources()
-        self._pending_selections = {}
+def _json_dumps(obj: Any) -> str:
+    """Serialize ``obj`` with the stdlib encoder.
 
-    def _rebuild_components_from_resources(self) -> None:
-        """Rebuild trace components from currently selected resource items."""
-        # Keep non-resource components (system prompt, user message, etc.)
-        resource_types = {r.resource_type.to_component_type() for r in self._resources}
-        non_resource_components = [
-            c for c in self._working_trace.components if c.type not in resource_types
-        ]
+    ``JSON.parse`` rejects ``NaN`` and ``Infinity``, so non-finite floats are
+    written as ``null``, the same as orjson does.
+    """
+    try:
+        return _JSON_ENCODER.encode(obj)
+    except ValueError:
+        return _JSON_ENCODER.encode(_finite(obj))
 
-        # Add selected items from resources as components
-        resource_components = []
-        for resource in self._resources:
-            resource_components.extend(resource.to_components())
 
-        # Combine and update trace
-        self._working_trace.components = non_resource_components + resource_components
-        self._working_trace.total_tokens = sum(
-            c.token_count for c in self._working_trace.components
-        )
+def _orjson_dumps(obj: Any) -> str:
+    """Serialize ``obj`` with orjson; only called when ``HAS_ORJSON``."""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
 
-    def _repr_html_(self) -> str:
-        """Jupyter auto-display."""
-        return self.to_html()
 
-    def display(self) -> None:
-        """Display in IPython/Jupyter."""
-        from IPython.display import HTML
-        from IPython.display import display as ipy_display
+# Components are embedded positionally as
+# ``id: [type, token_count, token_count_str, metadata]`` to keep key names out
+# of the payload; the widget script expands them back into objects. The
+# comma-grouped count is formatted here so the script never calls
+# ``toLocaleString`` on hover. This is everything up to the metadata value,
+# which (with the closing bracket) is appended per render since the dict can
+# change in place; empty metadata is left out of the entry altogether.
+# Contents go in a separate ``id: content`` block that is only parsed when a
+# modal first needs it.
+_COMPONENT_JSON_HEAD_TMPL = "%s: [%s, %s, %s"
+_COMPONENT_CONTENT_TMPL = "%s: %s"
 
-        ipy_display(HTML(self.to_html()))
 
-    def to_html(self) -> str:
-        """Generate the full HTML string."""
-        uid = self._uid
-        parts = [
-            f'<div id="ced-{uid}" class="ced-container">',
-            f"<style>{self._css(uid)}</style>",
-            self._header_html(uid),
-        ]
+def _script_json(text: str) -> str:
+    """Make serialized JSON safe to embed in a ``<script>`` element.
 
-        if self._resources:
-            parts.append(self._resources_panel_html(uid))
-        else:
-            parts.append(self._context_window_html(uid))
+    Escaping ``<`` keeps content such as ``</script>`` or ``<!--`` from
+    ending the element early; ``JSON.parse`` reads ``\\u003c`` back as ``<``.
+    """
+    return text.replace("<", "\\u003c")
+
+
+_MODAL_TMPL = (
+    '<div id="ced-modal-__UID__" class="ced-modal-overlay" style="display:none;">'
+    '<div class="ced-modal">'
+    '<div class="ced-modal-header" id="ced-modal-header-__UID__">'
+    '<span class="ced-modal-title" id="ced-modal-title-__UID__"></span>'
+    '<div class="ced-modal-actions">'
+    '<button class="ced-btn ced-modal-save" id="ced-modal-save-__UID__" '
+    'style="display:none;">Save</button>'
+    '<button class="ced-modal-close" '
+    'onclick="cedCloseModal___UID__()">\u2715</button>'
+    "</div>"
+    "</div>"
+    '<div class="ced-modal-body" id="ced-modal-body-__UID__">'
+    # The widget script fills these nodes in place for each component and
+    # swaps the text for the textarea in edit mode
+    '<div class="ced-modal-section">'
+    '<div class="ced-modal-section-title">Content</div>'
+    '<div class="ced-modal-text" id="ced-content-text-__UID__"></div>'
+    '<textarea class="ced-modal-textarea" id="ced-edit-textarea-__UID__" '
+    'style="display:none;"></textarea>'
+    '<div class="ced-modal-text-hint" id="ced-content-hint-__UID__">Click text to edit</div>'
+    "</div>"
+    '<div class="ced-modal-section">'
+    '<div class="ced-modal-section-title">Tokens</div>'
+    '<div id="ced-modal-tokens-__UID__"></div>'
+    "</div>"
+    '<div class="ced-modal-section" id="ced-modal-meta-__UID__" style="display:none;">'
+    '<div class="ced-modal-section-title">Metadata</div>'
+    '<table class="ced-metadata-table"><thead><tr><th>Key</th><th>Value</th></tr></thead>'
+    '<tbody id="ced-modal-meta-rows-__UID__"></tbody></table>'
+    "</div>"
+    "</div>"
+    "</div>"
+    "</div>"
+)
 
-        parts.append(self._legend_html(uid))
+_SCORE_BADGE_TMPL = '<span class="ced-doc-score">%.2f</span>'
+_SCORE_BADGE_SPAN_TMPL = '<span class="ced-score-badge">%s</span>'
+_AVAILABLE_ITEM_TMPL = (
+    '<div class="ced-doc-item %s" '
+    'data-item-id="%s" '
+    'data-resource="%s" '
+    'data-color="%s" '
+    'draggable="true" '
+    'style="border-left: 4px solid %s;">'
+    "%s"
+    "<span>%s</span>"
+    '<span class="ced-doc-tokens">%s tok</span>'
+    '<span class="ced-doc-check">%s</span>'
+    "</div>"
+)
+_UNUSED_COMP_TMPL = (
+    '<div class="ced-component ced-comp-unused" '
+    'style="height:%spx;" data-comp-id="_unused">'
+    '<span class="ced-left">'
+    '<span class="ced-label">Unused</span>'
+    "</span>"
+    '<span class="ced-tokens">%s</span>'
+    '<span class="ced-lacuna">...</span>'
+    "</div>"
+)
+_SELECTED_ITEM_TMPL = (
+    '<div class="ced-doc-item ced-selected" '
+    'data-item-id="%s" '
+    'data-resource="%s" '
+    'draggable="true" '
+    'style="background: %s; color: white;">'
+    "%s"
+    "<span>%s</span>"
+    '<span class="ced-doc-tokens">%s tok</span>'
+    "</div>"
+)
+_TRACE_ITEM_TMPL = (
+    '<div class="ced-doc-item %s" '
+    'data-comp-id="%s" '
+    'style="border: 2px solid black;">'
+    "<span>%s %s</span>"
+    '<span class="ced-doc-tokens">%s tok</span>'
+    "</div>"
+)
 
-        # Tooltip div
-        parts.append(
-            f'<div id="ced-tooltip-{uid}" class="ced-tooltip" style="display:none;"></div>'
-        )
 
-        # Modal overlay (hidden by default)
-        parts.append(self._modal_html(uid))
+# Per-type color rules, derived from the fixed palette at import
+_COMP_CSS_RULES = "\n".join(
+    f".ced-container .{css_cls} {{ background: {COMPONENT_COLORS[ct]}; color: {TEXT_COLORS[ct]}; }}"
+    for ct, css_cls in CSS_CLASSES.items()
+)
 
-        # Component data + JS
-        parts.append(self._component_data_script(uid))
-        parts.append(f"<script>{self._js(uid)}</script>")
-        parts.append("</div>")
-        return "\n".join(parts)
 
-    # ------------------------------------------------------------------ CSS
-    def _css(self, uid: str) -> str:
-        s = f"#ced-{uid}"
-        # Build component color rules dynamically
-        comp_rules = []
-        for ct, css_cls in CSS_CLASSES.items():
-            bg = COMPONENT_COLORS[ct]
-            fg = TEXT_COLORS[ct]
-            comp_rules.append(f"{s} .{css_cls} {{" f" background: {bg}; color: {fg}; }}")
-        comp_css = "\n".join(comp_rules)
-        return f"""
+def _build_css() -> str:
+    """Build the widget stylesheet, scoped to the ``.ced-container`` class."""
+    s = ".ced-container"
+    return f"""
 {s} * {{ box-sizing: border-box; margin: 0; padding: 0; }}
 {s} {{
   font-family: 'JetBrains Mono', 'IBM Plex Mono',
@@ -381,7 +356,7 @@ class ContextBuilder:
 {s} .ced-component .ced-tokens {{
   font-size: 11px; font-weight: 400; margin-left: auto;
 }}
-{comp_css}
+{_COMP_CSS_RULES}
 {s} .ced-comp-unused {{
   background: {UNUSED_COLOR}; border-style: dashed;
   color: {UNUSED_TEXT_COLOR};
@@ -590,376 +565,178 @@ class ContextBuilder:
 }}
 """
 
-    # -------------------------------------------------------------- Header
-    def _header_html(self, uid: str) -> str:
-        return (
-            f'<div class="ced-header">'
-            f'<span class="ced-title">Context Builder</span>'
-            f'<div class="ced-controls">'
-            f'<button class="ced-btn">\u2699</button>'
-            f"</div>"
-            f"</div>"
-        )
 
-    # ------------------------------------------------------ Context window
-    def _context_window_html(self, uid: str) -> str:
-        total = self.trace.total_tokens
-        limit = self.context_limit
-        pct = round(total / limit * 100) if limit else 0
-        token_str = f"{total:,} / {limit:,} TOKENS ({pct}%)"
+# Built once at import. Nothing in it is per-instance, so every widget embeds
+# the same stylesheet.
+_CSS = _build_css()
 
-        parts = [
-            '<div class="ced-context-window">',
-            '<span class="ced-window-label">Context Builder</span>',
-            f'<span class="ced-token-counter">{token_str}</span>',
-        ]
 
-        # Vertical layout
-        parts.append(f'<div class="ced-vertical" id="ced-vlayout-{uid}">')
-        items = compute_vertical_layout(self.trace)
-        for item in items:
-            parts.append(self._component_div(item, uid))
-        parts.append("</div>")
+@functools.lru_cache(maxsize=4096)
+def _escape_cached(text: str) -> str:
+    """``html.escape`` for component ids and resource names.
 
-        parts.append("</div>")
-        return "\n".join(parts)
+    These are the only strings escaped on the Python side (content is escaped
+    by the widget script and the JSON payload), and they repeat unchanged on
+    every render, so each distinct value is escaped once.
+    """
+    return html.escape(text)
+
+
+@functools.lru_cache(maxsize=4096)
+def _fmt_tokens(n: int) -> str:
+    """Format a token count with thousands separators; counts repeat a lot."""
+    return format(n, ",")
+
+
+@functools.lru_cache(maxsize=128)
+def _scoped_modal(uid: str) -> str:
+    """Return the modal skeleton for one instance; stable per uid, so cached."""
+    return _MODAL_TMPL.replace("__UID__", uid)
+
+
+# Widget script, shared by every instance on the page: it defines the type maps
+# and cedInit once, and each render only appends a cedInit('<uid>') call. The
+# __*_MAP__ sentinels are filled in once below, and both globals are suffixed
+# with a hash of the finished script so that a notebook page holding output
+# from another package version never runs that version's cedInit against this
+# markup.
+_JS_STATIC = """
+if (!window.__CED_MAPS) window.__CED_MAPS = {
+  colors: __COLOR_MAP__,
+  textColors: __TEXT_COLOR_MAP__,
+  labels: __LABEL_MAP__,
+  icons: __ICON_MAP__
+};
+if (!window.cedInit) window.cedInit = function(uid) {
+  var container = document.getElementById('ced-' + uid);
+  if (!container) return;
+  var tooltip = document.getElementById('ced-tooltip-' + uid);
+  var modal = document.getElementById('ced-modal-' + uid);
+  var saveBtn = document.getElementById('ced-modal-save-' + uid);
+  function readJson(id) {
+    var el = document.getElementById(id);
+    return el ? JSON.parse(el.textContent) : {};
+  }
+  // Components arrive as id -> [type, token_count, token_count_str, metadata?]
+  // (metadata only when non-empty); their contents are in a separate block,
+  // parsed on first use by withContent
+  var data = readJson('ced-data-' + uid);
+  Object.keys(data).forEach(function(id) {
+    var c = data[id];
+    data[id] = {
+      id: id, type: c[0], token_count: c[1], token_count_str: c[2], metadata: c[3]
+    };
+  });
+  var contents = null;
+  function withContent(info) {
+    if (info.content === undefined) {
+      if (!contents) contents = readJson('ced-content-' + uid);
+      info.content = contents[info.id];
+    }
+    return info;
+  }
+  var resourcesData = readJson('ced-resources-' + uid);
+  var currentInfo = null;
 
-    def _component_div(self, item: dict, uid: str) -> str:
-        """Render a single component div for vertical layout."""
-        height = item.get("height", 40)
+  // Color map, shared page-wide
+  var colorMap = window.__CED_MAPS.colors;
+  var textColorMap = window.__CED_MAPS.textColors;
+  var labelMap = window.__CED_MAPS.labels;
+  var iconMap = window.__CED_MAPS.icons;
 
-        if item["is_unused"]:
-            return (
-                f'<div class="ced-component ced-comp-unused" '
-                f'style="height:{height}px;" data-comp-id="_unused">'
-                f'<span class="ced-left">'
-                f'<span class="ced-label">Unused</span>'
-                f'</span>'
-                f'<span class="ced-tokens">{item["token_count"]:,}</span>'
-                f'<span class="ced-lacuna">...</span>'
-                f"</div>"
-            )
+  // Reordering only moves children, so the layout element itself is stable
+  var vertical = container.querySelector('.ced-vertical');
 
-        comp_type = item["type"]
-        css_cls = CSS_CLASSES.get(comp_type, "")
-        icon = COMPONENT_ICONS.get(comp_type, "")
-        label = COMPONENT_LABELS.get(comp_type, "")
-        comp_id = html.escape(item["id"])
+  // Close modal
+  var closeModal = window['cedCloseModal_' + uid] = function() {
+    if (modal) {
+      modal.style.display = 'none';
+      saveBtn.style.display = 'none';
+      currentInfo = null;
+    }
+  };
 
-        # Score badge for RAG docs
-        score_badge = ""
-        for comp in self.trace.components:
-            if comp.id == item["id"]:
-                sc = comp.metadata.get("chroma_score")
-                if sc is not None:
-                    score_badge = f'<span class="ced-score-badge">{sc}</span>'
-                break
+  // Show modal in view mode (click text to edit)
+  // Modal nodes are created once by the skeleton and updated in place
+  var modalTitle = document.getElementById('ced-modal-title-' + uid);
+  var modalHeader = document.getElementById('ced-modal-header-' + uid);
+  var contentText = document.getElementById('ced-content-text-' + uid);
+  var contentHint = document.getElementById('ced-content-hint-' + uid);
+  var editArea = document.getElementById('ced-edit-textarea-' + uid);
+  var tokensEl = document.getElementById('ced-modal-tokens-' + uid);
+  var metaSection = document.getElementById('ced-modal-meta-' + uid);
+  var metaRows = document.getElementById('ced-modal-meta-rows-' + uid);
+
+  function showModal(info) {
+    currentInfo = withContent(info);
+    var bg = colorMap[info.type] || '#999';
+    var fg = textColorMap[info.type] || '#000';
+    modalHeader.style.background = bg;
+    modalHeader.style.color = fg;
+    var icon = iconMap[info.type] || '';
+    var label = labelMap[info.type] || info.type;
+    modalTitle.textContent = icon + ' ' + label + ' — ' + info.id;
+    saveBtn.style.display = 'none';
 
-        return (
-            f'<div class="ced-component {css_cls}" '
-            f'style="height:{height}px;" data-comp-id="{comp_id}">'
-            f"{score_badge}"
-            f'<span class="ced-left">'
-            f'<span class="ced-icon">{icon}</span>'
-            f'<span class="ced-label">{html.escape(label)}</span>'
-            f'</span>'
-            f'<span class="ced-tokens">{item["token_count"]:,}</span>'
-            f"</div>"
-        )
+    // Clickable read-only content
+    contentText.textContent = info.content == null ? '' : info.content;
+    contentText.style.display = '';
+    contentHint.style.display = '';
+    editArea.style.display = 'none';
 
-    # -------------------------------------------------------- Resources panel
-    def _resources_panel_html(self, uid: str) -> str:
-        """Render two-panel view with Available resources and Context Builder."""
-        # Calculate total selected tokens
-        total_selected = sum(r.total_selected_tokens for r in self._resources)
-        total_selected += sum(
-            c.token_count
-            for c in self._working_trace.components
-            if c.type not in {r.resource_type.to_component_type() for r in self._resources}
-        )
-
-        # Left panel: Available items from all resources
-        left_items = []
-        for resource in self._resources:
-            # Resource header
-            left_items.append(
-                f'<div class="ced-resource-header" data-resource="{html.escape(resource.name)}">'
-                f"{html.escape(resource.name)} ({len(resource.items)} items)"
-                f"</div>"
-            )
-            # Sort by score if available
-            sorted_items = sorted(
-                resource.items, key=lambda x: x.score if x.score is not None else 0, reverse=True
-            )
-            for item in sorted_items:
-                is_selected = item.id in resource.selected_ids
-                sel_cls = "ced-selected" if is_selected else "ced-unselected"
-                score_badge = ""
-                if item.score is not None:
-                    score_badge = f'<span class="ced-doc-score">{item.score:.2f}</span>'
-                check = "\u2713" if is_selected else ""
-                res_type_color = COMPONENT_COLORS.get(resource.resource_type.to_component_type(), "#999")
-
-                left_items.append(
-                    f'<div class="ced-doc-item {sel_cls}" '
-                    f'data-item-id="{html.escape(item.id)}" '
-                    f'data-resource="{html.escape(resource.name)}" '
-                    f'data-color="{res_type_color}" '
-                    f'draggable="true" '
-                    f'style="border-left: 4px solid {res_type_color};">'
-                    f"{score_badge}"
-                    f"<span>{html.escape(item.id)}</span>"
-                    f'<span class="ced-doc-tokens">{item.token_count:,} tok</span>'
-                    f'<span class="ced-doc-check">{check}</span>'
-                    f"</div>"
-                )
-
-        # Right panel: Selected items + trace components
-        right_items = []
-
-        # Add selected resource items
-        for resource in self._resources:
-            for item in resource.selected_items:
-                score_badge = ""
-                if item.score is not None:
-                    score_badge = f'<span class="ced-doc-score">{item.score:.2f}</span>'
-                res_type_color = COMPONENT_COLORS.get(resource.resource_type.to_component_type(), "#999")
-                res_type_label = COMPONENT_LABELS.get(resource.resource_type.to_component_type(), "")
-
-                right_items.append(
-                    f'<div class="ced-doc-item ced-selected" '
-                    f'data-item-id="{html.escape(item.id)}" '
-                    f'data-resource="{html.escape(resource.name)}" '
-                    f'draggable="true" '
-                    f'style="background: {res_type_color}; color: white;">'
-                    f"{score_badge}"
-                    f"<span>{html.escape(item.id)}</span>"
-                    f'<span class="ced-doc-tokens">{item.token_count:,} tok</span>'
-                    f"</div>"
-                )
-
-        # Add non-resource trace components
-        resource_types = {r.resource_type.to_component_type() for r in self._resources}
-        for comp in self._working_trace.components:
-            if comp.type not in resource_types:
-                css_cls = CSS_CLASSES.get(comp.type, "")
-                icon = COMPONENT_ICONS.get(comp.type, "")
-                label = COMPONENT_LABELS.get(comp.type, "")
-                right_items.append(
-                    f'<div class="ced-doc-item {css_cls}" '
-                    f'data-comp-id="{html.escape(comp.id)}" '
-                    f'style="border: 2px solid black;">'
-                    f"<span>{icon} {html.escape(label)}</span>"
-                    f'<span class="ced-doc-tokens">{comp.token_count:,} tok</span>'
-                    f"</div>"
-                )
-
-        pct = round(total_selected / self.context_limit * 100) if self.context_limit else 0
-        token_str = f"{total_selected:,} / {self.context_limit:,} TOKENS ({pct}%)"
-
-        return (
-            f'<div class="ced-two-panel" id="ced-panels-{uid}">'
-            f'<div class="ced-panel ced-available-panel" id="ced-available-{uid}">'
-            f'<div class="ced-panel-header">Available</div>'
-            f'<div class="ced-panel-content" id="ced-available-content-{uid}">{"".join(left_items)}</div>'
-            f"</div>"
-            f'<div class="ced-panel-divider">'
-            f'<button class="ced-btn ced-save-selections" id="ced-save-btn-{uid}" '
-            f'style="display:none;">Save</button>'
-            f"</div>"
-            f'<div class="ced-panel ced-context-panel" id="ced-context-{uid}">'
-            f'<div class="ced-panel-header">Context Builder <span class="ced-token-badge">{token_str}</span></div>'
-            f'<div class="ced-panel-content" id="ced-context-content-{uid}">{"".join(right_items)}</div>'
-            f"</div>"
-            f"</div>"
-        )
-
-    # -------------------------------------------------------------- Legend
-    def _legend_html(self, uid: str) -> str:
-        items = []
-        for ct in ComponentType:
-            color = COMPONENT_COLORS[ct]
-            label = COMPONENT_LABELS[ct]
-            items.append(
-                f'<div class="ced-legend-item">'
-                f'<div class="ced-legend-swatch" style="background:{color};"></div>'
-                f'<span class="ced-legend-label">{html.escape(label)}</span>'
-                f"</div>"
-            )
-        # Unused
-        items.append(
-            f'<div class="ced-legend-item">'
-            f'<div class="ced-legend-swatch ced-dashed" '
-            f'style="background:{UNUSED_COLOR};"></div>'
-            f'<span class="ced-legend-label">Unused</span>'
-            f"</div>"
-        )
-        return f'<div class="ced-legend">{"".join(items)}</div>'
-
-    # -------------------------------------------------------------- Modal
-    def _modal_html(self, uid: str) -> str:
-        return (
-            f'<div id="ced-modal-{uid}" class="ced-modal-overlay" style="display:none;">'
-            f'<div class="ced-modal">'
-            f'<div class="ced-modal-header" id="ced-modal-header-{uid}">'
-            f'<span class="ced-modal-title" id="ced-modal-title-{uid}"></span>'
-            f'<div class="ced-modal-actions">'
-            f'<button class="ced-btn ced-modal-save" id="ced-modal-save-{uid}" '
-            f'style="display:none;">Save</button>'
-            f'<button class="ced-modal-close" '
-            f'onclick="cedCloseModal_{uid}()">\u2715</button>'
-            f"</div>"
-            f"</div>"
-            f'<div class="ced-modal-body" id="ced-modal-body-{uid}"></div>'
-            f"</div>"
-            f"</div>"
-        )
-
-    # ------------------------------------------------- Component data JSON
-    def _component_data_script(self, uid: str) -> str:
-        """Embed component data as a JS object for interaction modes."""
-        data = {}
-        for comp in self._working_trace.components:
-            data[comp.id] = {
-                "id": comp.id,
-                "type": comp.type.value,
-                "content": comp.content,
-                "token_count": comp.token_count,
-                "metadata": comp.metadata,
-            }
-
-        # Also embed resource data
-        resources_data = {}
-        for resource in self._resources:
-            resources_data[resource.name] = {
-                "name": resource.name,
-                "type": resource.resource_type.value,
-                "selected_ids": list(resource.selected_ids),
-                "items": [
-                    {
-                        "id": item.id,
-                        "content": item.content,
-                        "token_count": item.token_count,
-                        "score": item.score,
-                    }
-                    for item in resource.items
-                ],
-            }
-
-        return (
-            f"<script>var cedData_{uid} = {json.dumps(data, ensure_ascii=False)};\n"
-            f"var cedResources_{uid} = {json.dumps(resources_data, ensure_ascii=False)};</script>"
-        )
-
-    # ---------------------------------------------------------- JavaScript
-    def _js(self, uid: str) -> str:
-        return f"""
-(function() {{
-  var container = document.getElementById('ced-{uid}');
-  if (!container) return;
-  var tooltip = document.getElementById('ced-tooltip-{uid}');
-  var modal = document.getElementById('ced-modal-{uid}');
-  var saveBtn = document.getElementById('ced-modal-save-{uid}');
-  var data = typeof cedData_{uid} !== 'undefined' ? cedData_{uid} : {{}};
-  var currentInfo = null;
-
-  // Color map
-  var colorMap = {json.dumps({ct.value: COMPONENT_COLORS[ct] for ct in ComponentType})};
-  var textColorMap = {json.dumps({ct.value: TEXT_COLORS[ct] for ct in ComponentType})};
-  var labelMap = {json.dumps({ct.value: COMPONENT_LABELS[ct] for ct in ComponentType})};
-  var iconMap = {json.dumps({ct.value: COMPONENT_ICONS[ct] for ct in ComponentType})};
-
-  // Get all component elements
-  var components = container.querySelectorAll('.ced-component');
-
-  // Close modal
-  window.cedCloseModal_{uid} = function() {{
-    if (modal) {{
-      modal.style.display = 'none';
-      saveBtn.style.display = 'none';
-      currentInfo = null;
-    }}
-  }};
-
-  // Show modal in view mode (click text to edit)
-  function showModal(info) {{
-    currentInfo = info;
-    var header = document.getElementById('ced-modal-header-{uid}');
-    var title = document.getElementById('ced-modal-title-{uid}');
-    var body = document.getElementById('ced-modal-body-{uid}');
-    var bg = colorMap[info.type] || '#999';
-    var fg = textColorMap[info.type] || '#000';
-    header.style.background = bg;
-    header.style.color = fg;
-    var icon = iconMap[info.type] || '';
-    var label = labelMap[info.type] || info.type;
-    title.textContent = icon + ' ' + label + ' — ' + info.id;
-    saveBtn.style.display = 'none';
-
-    // Clickable read-only content
-    var contentHtml = '<div class="ced-modal-section">' +
-      '<div class="ced-modal-section-title">Content</div>' +
-      '<div class="ced-modal-text" id="ced-content-text-{uid}">' +
-      escapeHtml(info.content) + '</div>' +
-      '<div class="ced-modal-text-hint">Click text to edit</div></div>';
-
-    // Token count
-    contentHtml += '<div class="ced-modal-section">' +
-      '<div class="ced-modal-section-title">Tokens</div>' +
-      '<div>' + info.token_count.toLocaleString() + '</div></div>';
+    // Token count
+    tokensEl.textContent = info.token_count_str;
 
     // Metadata table
-    var meta = info.metadata || {{}};
-    var metaKeys = Object.keys(meta);
-    if (metaKeys.length > 0) {{
-      contentHtml += '<div class="ced-modal-section">' +
-        '<div class="ced-modal-section-title">Metadata</div>' +
-        '<table class="ced-metadata-table"><tr><th>Key</th><th>Value</th></tr>';
-      metaKeys.forEach(function(k) {{
-        contentHtml += '<tr><td>' + escapeHtml(k) + '</td><td>' +
-          escapeHtml(String(meta[k])) + '</td></tr>';
-      }});
-      contentHtml += '</table></div>';
-    }}
-
-    body.innerHTML = contentHtml;
+    var meta = info.metadata;
+    metaRows.textContent = '';
+    if (meta) {
+      var rows = document.createDocumentFragment();
+      Object.keys(meta).forEach(function(k) {
+        var tr = document.createElement('tr');
+        var key = document.createElement('td');
+        var value = document.createElement('td');
+        key.textContent = k;
+        value.textContent = String(meta[k]);
+        tr.appendChild(key);
+        tr.appendChild(value);
+        rows.appendChild(tr);
+      });
+      metaRows.appendChild(rows);
+    }
+    metaSection.style.display = meta ? '' : 'none';
+
     modal.style.display = 'flex';
+  }
 
-    // Add click-to-edit on content text
-    var contentText = document.getElementById('ced-content-text-{uid}');
-    if (contentText) {{
-      contentText.addEventListener('click', function() {{
-        switchToEditMode(info);
-      }});
-    }}
-  }}
+  // Click-to-edit on content text
+  if (contentText) {
+    contentText.addEventListener('click', function() {
+      if (currentInfo) switchToEditMode(currentInfo);
+    });
+  }
 
   // Switch to edit mode
-  function switchToEditMode(info) {{
-    var title = document.getElementById('ced-modal-title-{uid}');
+  function switchToEditMode(info) {
     var icon = iconMap[info.type] || '';
     var label = labelMap[info.type] || info.type;
-    title.textContent = icon + ' EDIT: ' + label + ' — ' + info.id;
+    modalTitle.textContent = icon + ' EDIT: ' + label + ' — ' + info.id;
 
-    // Replace text with textarea
-    var contentSection = document.querySelector('#ced-{uid} .ced-modal-section');
-    if (contentSection) {{
-      contentSection.innerHTML =
-        '<div class="ced-modal-section-title">Content</div>' +
-        '<textarea class="ced-modal-textarea" id="ced-edit-textarea-{uid}">' +
-        escapeHtml(info.content) + '</textarea>';
-    }}
+    // Swap the text for the textarea
+    editArea.value = info.content == null ? '' : info.content;
+    contentText.style.display = 'none';
+    contentHint.style.display = 'none';
+    editArea.style.display = '';
 
     // Show save button
     saveBtn.style.display = 'block';
 
     // Focus textarea
-    var textarea = document.getElementById('ced-edit-textarea-{uid}');
-    if (textarea) textarea.focus();
-  }}
+    editArea.focus();
+  }
 
   // Drag-and-drop state
-  var dragState = {{
+  var dragState = {
     isDragging: false,
     draggedEl: null,
     draggedId: null,
@@ -967,12 +744,13 @@ class ContextBuilder:
     startY: 0,
     startTime: 0,
     currentDropTarget: null,
-    dropPosition: null
-  }};
+    dropPosition: null,
+    rects: null
+  };
   var DRAG_THRESHOLD_PX = 5;
   var DRAG_THRESHOLD_MS = 150;
 
-  function handleDragStart(el, e) {{
+  function handleDragStart(el, e) {
     if (el.getAttribute('data-comp-id') === '_unused') return;
 
     dragState.startX = e.clientX;
@@ -983,9 +761,9 @@ class ContextBuilder:
 
     document.addEventListener('mousemove', handleDragMove);
     document.addEventListener('mouseup', handleDragEnd);
-  }}
+  }
 
-  function handleDragMove(e) {{
+  function handleDragMove(e) {
     if (!dragState.draggedEl) return;
 
     var dx = e.clientX - dragState.startX;
@@ -993,537 +771,1158 @@ class ContextBuilder:
     var distance = Math.sqrt(dx * dx + dy * dy);
     var elapsed = Date.now() - dragState.startTime;
 
-    if (!dragState.isDragging && (distance > DRAG_THRESHOLD_PX || elapsed > DRAG_THRESHOLD_MS)) {{
+    if (!dragState.isDragging && (distance > DRAG_THRESHOLD_PX || elapsed > DRAG_THRESHOLD_MS)) {
       enterDragMode();
-    }}
+    }
 
-    if (dragState.isDragging) {{
+    if (dragState.isDragging) {
       updateDropTarget(e);
-    }}
-  }}
+    }
+  }
 
-  function enterDragMode() {{
+  function enterDragMode() {
     dragState.isDragging = true;
     dragState.draggedEl.classList.add('ced-dragging');
 
-    var vertical = container.querySelector('.ced-vertical');
     if (vertical) vertical.classList.add('ced-dragging-active');
 
     tooltip.style.display = 'none';
-  }}
-
-  function updateDropTarget(e) {{
-    var vertical = container.querySelector('.ced-vertical');
-    if (!vertical) return;
 
+    // Drop-target rects are measured lazily on the first move and reused
+    // until the viewport changes
+    dragState.rects = null;
+    window.addEventListener('resize', invalidateDropRects);
+    window.addEventListener('scroll', invalidateDropRects, true);
+  }
+
+  function invalidateDropRects() {
+    dragState.rects = null;
+  }
+
+  function measureDropRects() {
+    var rects = [];
+    if (vertical) {
+      var comps = vertical.querySelectorAll('.ced-component:not(.ced-comp-unused):not(.ced-dragging)');
+      for (var i = 0; i < comps.length; i++) {
+        var r = comps[i].getBoundingClientRect();
+        rects.push({
+          el: comps[i], left: r.left, right: r.right,
+          top: r.top, bottom: r.bottom, mid: r.top + r.height / 2
+        });
+      }
+    }
+    return rects;
+  }
+
+  function updateDropTarget(e) {
     clearDropIndicators();
 
-    var comps = vertical.querySelectorAll('.ced-component:not(.ced-comp-unused):not(.ced-dragging)');
-
-    for (var i = 0; i < comps.length; i++) {{
-      var comp = comps[i];
-      var rect = comp.getBoundingClientRect();
+    if (!dragState.rects) dragState.rects = measureDropRects();
+    var rects = dragState.rects;
 
-      if (e.clientX >= rect.left && e.clientX <= rect.right &&
-          e.clientY >= rect.top && e.clientY <= rect.bottom) {{
+    // Components are stacked top to bottom, so the rects are sorted by top
+    var lo = 0, hi = rects.length - 1;
+    while (lo <= hi) {
+      var m = (lo + hi) >> 1;
+      var rect = rects[m];
+      if (e.clientY < rect.top) {
+        hi = m - 1;
+      } else if (e.clientY > rect.bottom) {
+        lo = m + 1;
+      } else {
+        if (e.clientX < rect.left || e.clientX > rect.right) return;
 
-        var midY = rect.top + rect.height / 2;
-        var position = e.clientY < midY ? 'before' : 'after';
+        var position = e.clientY < rect.mid ? 'before' : 'after';
 
-        dragState.currentDropTarget = comp;
+        dragState.currentDropTarget = rect.el;
         dragState.dropPosition = position;
 
-        comp.classList.add(position === 'before' ? 'ced-drop-above' : 'ced-drop-below');
-        break;
-      }}
-    }}
-  }}
-
-  function clearDropIndicators() {{
-    var indicators = container.querySelectorAll('.ced-drop-above, .ced-drop-below');
-    indicators.forEach(function(el) {{
-      el.classList.remove('ced-drop-above', 'ced-drop-below');
-    }});
+        rect.el.classList.add(position === 'before' ? 'ced-drop-above' : 'ced-drop-below');
+        return;
+      }
+    }
+  }
+
+  function clearDropIndicators() {
+    // At most one component carries an indicator: the current drop target
+    if (dragState.currentDropTarget) {
+      dragState.currentDropTarget.classList.remove('ced-drop-above', 'ced-drop-below');
+    }
     dragState.currentDropTarget = null;
     dragState.dropPosition = null;
-  }}
+  }
 
-  function handleDragEnd(e) {{
+  function handleDragEnd(e) {
     document.removeEventListener('mousemove', handleDragMove);
     document.removeEventListener('mouseup', handleDragEnd);
 
-    if (dragState.isDragging) {{
-      if (dragState.currentDropTarget && dragState.draggedEl) {{
+    if (dragState.isDragging) {
+      if (dragState.currentDropTarget && dragState.draggedEl) {
         performReorder();
-      }}
+      }
       exitDragMode();
-    }} else {{
+    } else {
       dragState.draggedEl = null;
       dragState.draggedId = null;
-    }}
-  }}
+    }
+  }
 
-  function performReorder() {{
+  function performReorder() {
     var target = dragState.currentDropTarget;
     var dragged = dragState.draggedEl;
     var position = dragState.dropPosition;
 
-    if (!target || !dragged || target === dragged) return;
-
-    var vertical = container.querySelector('.ced-vertical');
-    if (!vertical) return;
+    if (!target || !dragged || target === dragged || !vertical) return;
 
-    if (position === 'before') {{
+    if (position === 'before') {
       vertical.insertBefore(dragged, target);
-    }} else {{
+    } else {
       var next = target.nextElementSibling;
-      if (next) {{
+      if (next) {
         vertical.insertBefore(dragged, next);
-      }} else {{
+      } else {
         vertical.appendChild(dragged);
-      }}
-    }}
+      }
+    }
 
     updateComponentOrder();
-  }}
+  }
 
-  function exitDragMode() {{
-    if (dragState.draggedEl) {{
+  function exitDragMode() {
+    if (dragState.draggedEl) {
       dragState.draggedEl.classList.remove('ced-dragging');
-    }}
+    }
 
-    var vertical = container.querySelector('.ced-vertical');
     if (vertical) vertical.classList.remove('ced-dragging-active');
 
     clearDropIndicators();
 
+    window.removeEventListener('resize', invalidateDropRects);
+    window.removeEventListener('scroll', invalidateDropRects, true);
+    dragState.rects = null;
     dragState.isDragging = false;
     dragState.draggedEl = null;
     dragState.draggedId = null;
     dragState.startX = 0;
     dragState.startY = 0;
     dragState.startTime = 0;
-  }}
+  }
 
-  function updateComponentOrder() {{
-    var vertical = container.querySelector('.ced-vertical');
+  function updateComponentOrder() {
     if (!vertical) return;
 
     var newOrder = [];
     var comps = vertical.querySelectorAll('.ced-component:not(.ced-comp-unused)');
-    comps.forEach(function(el) {{
+    comps.forEach(function(el) {
       var id = el.getAttribute('data-comp-id');
-      if (id && id !== '_unused') {{
+      if (id && id !== '_unused') {
         newOrder.push(id);
-      }}
-    }});
+      }
+    });
 
-    container.setAttribute('data-component-order', JSON.stringify(newOrder));
+    orderState = newOrder;
+    stateStale = true;
 
-    var event = new CustomEvent('ced-reorder', {{
-      detail: {{ order: newOrder, uid: '{uid}' }}
-    }});
+    var event = new CustomEvent('ced-reorder', {
+      detail: { order: newOrder, uid: uid }
+    });
     container.dispatchEvent(event);
-  }}
-
-  // Save button handler - persist edits to data attributes
-  if (saveBtn) {{
-    saveBtn.addEventListener('click', function() {{
-      var textarea = document.getElementById('ced-edit-textarea-{uid}');
-      if (textarea && currentInfo) {{
-        var edits = JSON.parse(container.getAttribute('data-edits') || '{{}}');
-        edits[currentInfo.id] = {{
+  }
+
+  // Pending edits and order live here; the data attributes are only
+  // serialized from them when the state is read
+  var editsState = {};
+  var orderState = null;
+  var stateStale = false;
+
+  function syncStateAttributes() {
+    if (!stateStale) return;
+    container.setAttribute('data-edits', JSON.stringify(editsState));
+    if (orderState) {
+      container.setAttribute('data-component-order', JSON.stringify(orderState));
+    }
+    container.setAttribute('data-selections', JSON.stringify(pendingSelections));
+    stateStale = false;
+  }
+
+  // Save button handler - record the edit and flag the data attributes
+  if (saveBtn) {
+    saveBtn.addEventListener('click', function() {
+      if (editArea && currentInfo) {
+        editsState[currentInfo.id] = {
           original: currentInfo.content,
-          edited: textarea.value,
+          edited: editArea.value,
           timestamp: new Date().toISOString()
-        }};
-        container.setAttribute('data-edits', JSON.stringify(edits));
-        currentInfo.content = textarea.value;
-        data[currentInfo.id].content = textarea.value;
+        };
+        stateStale = true;
+        currentInfo.content = editArea.value;
+        data[currentInfo.id].content = editArea.value;
         container.setAttribute('data-has-changes', 'true');
-      }}
-      cedCloseModal_{uid}();
-    }});
-  }}
+      }
+      closeModal();
+    });
+  }
 
   // State retrieval function for Python sync
-  window.cedGetState_{uid} = function() {{
-    return {{
-      edits: JSON.parse(container.getAttribute('data-edits') || '{{}}'),
+  window['cedGetState_' + uid] = function() {
+    syncStateAttributes();
+    return {
+      edits: JSON.parse(container.getAttribute('data-edits') || '{}'),
       componentOrder: JSON.parse(container.getAttribute('data-component-order') || '[]'),
-      selections: JSON.parse(container.getAttribute('data-selections') || '{{}}'),
+      selections: JSON.parse(container.getAttribute('data-selections') || '{}'),
       hasChanges: container.getAttribute('data-has-changes') === 'true'
-    }};
-  }};
+    };
+  };
 
   // Cross-panel drag-and-drop for resources
-  var availablePanel = document.getElementById('ced-available-{uid}');
-  var contextPanel = document.getElementById('ced-context-{uid}');
-  var saveSelectionsBtn = document.getElementById('ced-save-btn-{uid}');
-  var pendingSelections = {{}};
+  var availablePanel = document.getElementById('ced-available-' + uid);
+  var contextPanel = document.getElementById('ced-context-' + uid);
+  var saveSelectionsBtn = document.getElementById('ced-save-btn-' + uid);
+  var pendingSelections = {};
+
+  function docItemFromEvent(e, panel) {
+    var el = e.target.closest ? e.target.closest('.ced-doc-item') : null;
+    return el && panel.contains(el) ? el : null;
+  }
 
-  function initCrossPanelDrag() {{
+  function initCrossPanelDrag() {
     if (!availablePanel || !contextPanel) return;
 
-    // Get all draggable items
-    var draggableItems = container.querySelectorAll('.ced-doc-item[draggable="true"]');
-
-    draggableItems.forEach(function(item) {{
-      item.addEventListener('dragstart', function(e) {{
-        e.dataTransfer.setData('text/plain', JSON.stringify({{
-          itemId: item.getAttribute('data-item-id'),
-          resource: item.getAttribute('data-resource'),
-          fromContext: item.closest('.ced-context-panel') !== null
-        }}));
-        e.dataTransfer.effectAllowed = 'move';
-        item.classList.add('ced-dragging');
-      }});
-
-      item.addEventListener('dragend', function(e) {{
-        item.classList.remove('ced-dragging');
-        availablePanel.classList.remove('ced-drop-target');
-        contextPanel.classList.remove('ced-drop-target');
-      }});
-    }});
-
-    // Context panel accepts drops from Available
-    contextPanel.addEventListener('dragover', function(e) {{
+    // Drag handlers are delegated to the container, so items moved into the
+    // Context panel need no per-element setup
+    container.addEventListener('dragstart', function(e) {
+      var item = docItemFromEvent(e, container);
+      if (!item || item.getAttribute('draggable') !== 'true') return;
+      e.dataTransfer.setData('text/plain', JSON.stringify({
+        itemId: item.getAttribute('data-item-id'),
+        resource: item.getAttribute('data-resource'),
+        fromContext: item.closest('.ced-context-panel') !== null
+      }));
+      e.dataTransfer.effectAllowed = 'move';
+      item.classList.add('ced-dragging');
+    });
+
+    container.addEventListener('dragend', function(e) {
+      var item = docItemFromEvent(e, container);
+      if (item) item.classList.remove('ced-dragging');
+      availablePanel.classList.remove('ced-drop-target');
+      contextPanel.classList.remove('ced-drop-target');
+      clearContextDropIndicators();
+    });
+
+    // Context panel accepts drops from Available, and reorders its own items
+    contextPanel.addEventListener('dragover', function(e) {
       e.preventDefault();
       e.dataTransfer.dropEffect = 'move';
       contextPanel.classList.add('ced-drop-target');
-    }});
+      clearContextDropIndicators();
+      var item = docItemFromEvent(e, contextPanel);
+      if (item) {
+        var rect = item.getBoundingClientRect();
+        var midY = rect.top + rect.height / 2;
+        item.classList.add(e.clientY < midY ? 'ced-drop-above' : 'ced-drop-below');
+      }
+    });
 
-    contextPanel.addEventListener('dragleave', function(e) {{
+    contextPanel.addEventListener('dragleave', function(e) {
       contextPanel.classList.remove('ced-drop-target');
-    }});
+    });
 
-    contextPanel.addEventListener('drop', function(e) {{
+    contextPanel.addEventListener('drop', function(e) {
       e.preventDefault();
       contextPanel.classList.remove('ced-drop-target');
-      try {{
+      clearContextDropIndicators();
+      try {
         var data = JSON.parse(e.dataTransfer.getData('text/plain'));
-        if (!data.fromContext && data.itemId && data.resource) {{
+        if (!data.itemId || !data.resource) return;
+        if (!data.fromContext) {
           selectItem(data.resource, data.itemId);
-        }}
-      }} catch (err) {{}}
-    }});
+          return;
+        }
+        // Internal reorder
+        var item = docItemFromEvent(e, contextPanel);
+        var draggedItem = contextPanel.querySelector(
+          '.ced-doc-item[data-item-id="' + data.itemId + '"][data-resource="' + data.resource + '"]'
+        );
+        if (item && draggedItem && draggedItem !== item) {
+          var rect = item.getBoundingClientRect();
+          var midY = rect.top + rect.height / 2;
+          if (e.clientY < midY) {
+            item.parentNode.insertBefore(draggedItem, item);
+          } else {
+            item.parentNode.insertBefore(draggedItem, item.nextSibling);
+          }
+          showSaveButton();
+        }
+      } catch (err) {}
+    });
 
     // Available panel accepts drops from Context
-    availablePanel.addEventListener('dragover', function(e) {{
+    availablePanel.addEventListener('dragover', function(e) {
       e.preventDefault();
       e.dataTransfer.dropEffect = 'move';
       availablePanel.classList.add('ced-drop-target');
-    }});
+    });
 
-    availablePanel.addEventListener('dragleave', function(e) {{
+    availablePanel.addEventListener('dragleave', function(e) {
       availablePanel.classList.remove('ced-drop-target');
-    }});
+    });
 
-    availablePanel.addEventListener('drop', function(e) {{
+    availablePanel.addEventListener('drop', function(e) {
       e.preventDefault();
       availablePanel.classList.remove('ced-drop-target');
-      try {{
+      try {
         var data = JSON.parse(e.dataTransfer.getData('text/plain'));
-        if (data.fromContext && data.itemId && data.resource) {{
+        if (data.fromContext && data.itemId && data.resource) {
           deselectItem(data.resource, data.itemId);
-        }}
-      }} catch (err) {{}}
-    }});
-  }}
+        }
+      } catch (err) {}
+    });
+  }
 
-  function selectItem(resourceName, itemId) {{
+  function selectItem(resourceName, itemId) {
     // Initialize resource selections if needed
-    if (!pendingSelections[resourceName]) {{
+    if (!pendingSelections[resourceName]) {
       pendingSelections[resourceName] = [];
       // Get currently selected items
       var selectedInContext = contextPanel.querySelectorAll(
         '.ced-doc-item[data-resource="' + resourceName + '"]'
       );
-      selectedInContext.forEach(function(el) {{
+      selectedInContext.forEach(function(el) {
         pendingSelections[resourceName].push(el.getAttribute('data-item-id'));
-      }});
-    }}
+      });
+    }
 
     // Add to selections
-    if (pendingSelections[resourceName].indexOf(itemId) === -1) {{
+    if (pendingSelections[resourceName].indexOf(itemId) === -1) {
       pendingSelections[resourceName].push(itemId);
-    }}
+    }
 
     // Update UI
     updateSelectionUI(resourceName, itemId, true);
     showSaveButton();
-  }}
+  }
 
-  function deselectItem(resourceName, itemId) {{
-    if (!pendingSelections[resourceName]) {{
+  function deselectItem(resourceName, itemId) {
+    if (!pendingSelections[resourceName]) {
       pendingSelections[resourceName] = [];
       var selectedInContext = contextPanel.querySelectorAll(
         '.ced-doc-item[data-resource="' + resourceName + '"]'
       );
-      selectedInContext.forEach(function(el) {{
+      selectedInContext.forEach(function(el) {
         pendingSelections[resourceName].push(el.getAttribute('data-item-id'));
-      }});
-    }}
+      });
+    }
 
     // Remove from selections
     var idx = pendingSelections[resourceName].indexOf(itemId);
-    if (idx !== -1) {{
+    if (idx !== -1) {
       pendingSelections[resourceName].splice(idx, 1);
-    }}
+    }
 
     // Update UI
     updateSelectionUI(resourceName, itemId, false);
     showSaveButton();
-  }}
+  }
 
-  function updateSelectionUI(resourceName, itemId, selected) {{
+  function updateSelectionUI(resourceName, itemId, selected) {
     // Update item in Available panel
     var availableItem = availablePanel.querySelector(
       '.ced-doc-item[data-item-id="' + itemId + '"][data-resource="' + resourceName + '"]'
     );
-    if (availableItem) {{
-      if (selected) {{
+    if (availableItem) {
+      if (selected) {
         availableItem.classList.add('ced-selected');
         availableItem.classList.remove('ced-unselected');
         availableItem.querySelector('.ced-doc-check').textContent = '\\u2713';
-      }} else {{
+      } else {
         availableItem.classList.remove('ced-selected');
         availableItem.classList.add('ced-unselected');
         availableItem.querySelector('.ced-doc-check').textContent = '';
-      }}
-    }}
+      }
+    }
 
     // Add/remove from Context panel
-    var contextContent = document.getElementById('ced-context-content-{uid}');
     var contextItem = contextPanel.querySelector(
       '.ced-doc-item[data-item-id="' + itemId + '"][data-resource="' + resourceName + '"]'
-    );
+    ) || takeQueuedItem(resourceName, itemId, selected);
 
-    if (selected && !contextItem && availableItem) {{
-      // Clone and add to context
+    if (selected && !contextItem && availableItem) {
+      // Clone and add to context; delegated handlers cover the new element
       var clone = availableItem.cloneNode(true);
-      clone.classList.remove('ced-unselected');
+      clone.classList.remove('ced-unselected', 'ced-dragging');
       clone.classList.add('ced-selected');
       var itemColor = availableItem.getAttribute('data-color') || '#00AA55';
       clone.style.background = itemColor;
       clone.style.color = 'white';
       clone.style.borderLeft = '';
       clone.querySelector('.ced-doc-check').textContent = '';
-      contextContent.appendChild(clone);
-      // Re-init drag and click handlers on the new element
-      initDragOnElement(clone);
-      initDocItemClickHandlers();
-    }} else if (!selected && contextItem) {{
+      queueContextItem(clone);
+    } else if (!selected && contextItem) {
       contextItem.remove();
-    }}
-  }}
-
-  function initDragOnElement(item) {{
-    item.addEventListener('dragstart', function(e) {{
-      e.dataTransfer.setData('text/plain', JSON.stringify({{
-        itemId: item.getAttribute('data-item-id'),
-        resource: item.getAttribute('data-resource'),
-        fromContext: item.closest('.ced-context-panel') !== null
-      }}));
-      e.dataTransfer.effectAllowed = 'move';
-      item.classList.add('ced-dragging');
-    }});
-
-    item.addEventListener('dragend', function(e) {{
-      item.classList.remove('ced-dragging');
-      availablePanel.classList.remove('ced-drop-target');
-      contextPanel.classList.remove('ced-drop-target');
-      clearContextDropIndicators();
-    }});
-
-    // Add reorder handlers for context panel items
-    item.addEventListener('dragover', function(e) {{
-      if (!item.closest('.ced-context-panel')) return;
-      e.preventDefault();
-      e.stopPropagation();
-      clearContextDropIndicators();
-      var rect = item.getBoundingClientRect();
-      var midY = rect.top + rect.height / 2;
-      if (e.clientY < midY) {{
-        item.classList.add('ced-drop-above');
-      }} else {{
-        item.classList.add('ced-drop-below');
-      }}
-    }});
-
-    item.addEventListener('dragleave', function(e) {{
-      item.classList.remove('ced-drop-above', 'ced-drop-below');
-    }});
-
-    item.addEventListener('drop', function(e) {{
-      if (!item.closest('.ced-context-panel')) return;
-      e.preventDefault();
-      e.stopPropagation();
-      contextPanel.classList.remove('ced-drop-target');
-      clearContextDropIndicators();
-      try {{
-        var data = JSON.parse(e.dataTransfer.getData('text/plain'));
-        if (data.fromContext && data.itemId && data.resource) {{
-          // Internal reorder
-          var draggedItem = contextPanel.querySelector(
-            '.ced-doc-item[data-item-id="' + data.itemId + '"][data-resource="' + data.resource + '"]'
-          );
-          if (draggedItem && draggedItem !== item) {{
-            var rect = item.getBoundingClientRect();
-            var midY = rect.top + rect.height / 2;
-            if (e.clientY < midY) {{
-              item.parentNode.insertBefore(draggedItem, item);
-            }} else {{
-              item.parentNode.insertBefore(draggedItem, item.nextSibling);
-            }}
-            showSaveButton();
-          }}
-        }}
-      }} catch (err) {{}}
-    }});
-  }}
-
-  function clearContextDropIndicators() {{
+    }
+  }
+
+  // Items added to the Context panel are queued and inserted together on the
+  // next frame through one DocumentFragment, so a burst of selections costs a
+  // single reflow
+  var queuedItems = [];
+
+  function queueContextItem(el) {
+    queuedItems.push(el);
+    if (queuedItems.length === 1) requestAnimationFrame(flushContextItems);
+  }
+
+  function flushContextItems() {
+    var contextContent = document.getElementById('ced-context-content-' + uid);
+    var fragment = document.createDocumentFragment();
+    queuedItems.forEach(function(el) { fragment.appendChild(el); });
+    queuedItems = [];
+    if (contextContent) contextContent.appendChild(fragment);
+  }
+
+  // A queued item is not in the panel yet; when it is deselected before the
+  // flush it is dropped from the queue, and when it is selected again it is
+  // reported as present
+  function takeQueuedItem(resourceName, itemId, keep) {
+    for (var i = 0; i < queuedItems.length; i++) {
+      var el = queuedItems[i];
+      if (el.getAttribute('data-item-id') === itemId &&
+          el.getAttribute('data-resource') === resourceName) {
+        if (!keep) queuedItems.splice(i, 1);
+        return keep ? el : null;
+      }
+    }
+    return null;
+  }
+
+  function clearContextDropIndicators() {
     var indicators = contextPanel.querySelectorAll('.ced-drop-above, .ced-drop-below');
-    indicators.forEach(function(el) {{
+    indicators.forEach(function(el) {
       el.classList.remove('ced-drop-above', 'ced-drop-below');
-    }});
-  }}
+    });
+  }
 
-  function showSaveButton() {{
-    if (saveSelectionsBtn) {{
+  function showSaveButton() {
+    if (saveSelectionsBtn) {
       saveSelectionsBtn.style.display = 'block';
-      container.setAttribute('data-selections', JSON.stringify(pendingSelections));
+      stateStale = true;
       container.setAttribute('data-has-changes', 'true');
-    }}
-  }}
+    }
+  }
 
   // Save selections button handler
-  if (saveSelectionsBtn) {{
-    saveSelectionsBtn.addEventListener('click', function() {{
-      container.setAttribute('data-selections', JSON.stringify(pendingSelections));
+  if (saveSelectionsBtn) {
+    saveSelectionsBtn.addEventListener('click', function() {
+      stateStale = true;
+      syncStateAttributes();
       saveSelectionsBtn.style.display = 'none';
 
       // Dispatch event for external listeners
-      var event = new CustomEvent('ced-selections-saved', {{
-        detail: {{ selections: pendingSelections, uid: '{uid}' }}
-      }});
+      var event = new CustomEvent('ced-selections-saved', {
+        detail: { selections: pendingSelections, uid: uid }
+      });
       container.dispatchEvent(event);
-    }});
-  }}
+    });
+  }
 
   // Initialize cross-panel drag
   initCrossPanelDrag();
 
-  // Add click handlers for two-panel view items (both Available and Context panels)
-  function initDocItemClickHandlers() {{
-    var docItems = container.querySelectorAll('.ced-doc-item');
-    docItems.forEach(function(el) {{
-      // Skip if already has click handler
-      if (el.hasAttribute('data-click-init')) return;
-      el.setAttribute('data-click-init', 'true');
-
-      el.addEventListener('click', function(e) {{
-        // Skip if this is a drag operation
-        if (el.classList.contains('ced-dragging')) return;
-
-        // Check for component (non-resource item)
-        var compId = el.getAttribute('data-comp-id');
-        if (compId && data[compId]) {{
-          showModal(data[compId]);
-          return;
-        }}
-
-        // Check for resource item (works for both Available and Context panels)
-        var itemId = el.getAttribute('data-item-id');
-        var resourceName = el.getAttribute('data-resource');
-        if (itemId && resourceName) {{
-          var resourcesData = typeof cedResources_{uid} !== 'undefined' ? cedResources_{uid} : {{}};
-          var resourceData = resourcesData[resourceName];
-          if (resourceData && resourceData.items) {{
-            var item = resourceData.items.find(function(i) {{ return i.id === itemId; }});
-            if (item) {{
-              var info = {{
-                id: item.id,
-                type: resourceData.type,
-                content: item.content,
-                token_count: item.token_count,
-                metadata: item.score !== null ? {{ score: item.score }} : {{}}
-              }};
-              showModal(info);
-            }}
-          }}
-        }}
-      }});
-    }});
-  }}
-
-  // Initialize click handlers for existing items
-  initDocItemClickHandlers();
-
-  // Event handlers for each component
-  components.forEach(function(el) {{
-    // Hover → Tooltip
-    el.addEventListener('mouseenter', function(e) {{
-      var compId = el.getAttribute('data-comp-id');
-      var info = data[compId];
-      var text;
-      if (compId === '_unused') {{
-        text = el.classList.contains('ced-collapsed')
-          ? 'CLICK TO EXPAND'
-          : 'UNUSED — CLICK TO COLLAPSE';
-      }} else {{
-        text = info ? info.type.toUpperCase().replace('_', ' ') + ' — ' +
-          info.token_count.toLocaleString() + ' TOKENS' : compId;
-      }}
-      tooltip.textContent = text;
-      tooltip.style.display = 'block';
-      var rect = el.getBoundingClientRect();
-      var cRect = container.getBoundingClientRect();
-      tooltip.style.left = (rect.left - cRect.left + rect.width / 2 -
-        tooltip.offsetWidth / 2) + 'px';
-      tooltip.style.top = (rect.top - cRect.top - tooltip.offsetHeight - 8) + 'px';
-    }});
-    el.addEventListener('mouseleave', function() {{
-      tooltip.style.display = 'none';
-    }});
-
-    // Click → Toggle unused collapse OR open modal (skip if dragging)
-    el.addEventListener('click', function() {{
-      if (dragState.isDragging) return;
-
-      var compId = el.getAttribute('data-comp-id');
-      if (compId === '_unused') {{
-        el.classList.toggle('ced-collapsed');
-        return;
-      }}
-      var info = data[compId];
-      if (!info) return;
-      showModal(info);
-    }});
-
-    // Mousedown → Start potential drag
-    el.addEventListener('mousedown', function(e) {{
-      if (e.button !== 0) return;
-      handleDragStart(el, e);
-    }});
-  }});
+  // Click handler for two-panel view items (both Available and Context panels)
+  container.addEventListener('click', function(e) {
+    var el = docItemFromEvent(e, container);
+    // Skip if this is a drag operation
+    if (!el || el.classList.contains('ced-dragging')) return;
+
+    // Check for component (non-resource item)
+    var compId = el.getAttribute('data-comp-id');
+    if (compId && data[compId]) {
+      showModal(data[compId]);
+      return;
+    }
+
+    // Check for resource item (works for both Available and Context panels)
+    var itemId = el.getAttribute('data-item-id');
+    var resourceName = el.getAttribute('data-resource');
+    if (itemId && resourceName) {
+      var resourceData = resourcesData[resourceName];
+      if (resourceData && resourceData.items) {
+        var item = resourceData.items.find(function(i) { return i.id === itemId; });
+        if (item) {
+          var info = {
+            id: item.id,
+            type: resourceData.type,
+            content: item.content,
+            token_count: item.token_count,
+            token_count_str: item.token_count_str,
+            metadata: item.score !== null ? { score: item.score } : undefined
+          };
+          showModal(info);
+        }
+      }
+    }
+  });
+
+  // Component event handlers, delegated to the container so the listener
+  // count does not grow with the trace
+  function componentFromEvent(e) {
+    var el = e.target.closest ? e.target.closest('.ced-component') : null;
+    return el && container.contains(el) ? el : null;
+  }
+
+  // Hover → Tooltip. mouseover/mouseout bubble; moves between children of the
+  // same component are ignored so they behave like mouseenter/mouseleave.
+  container.addEventListener('mouseover', function(e) {
+    var el = componentFromEvent(e);
+    if (!el || (e.relatedTarget && el.contains(e.relatedTarget))) return;
+    var compId = el.getAttribute('data-comp-id');
+    var info = data[compId];
+    var text;
+    if (compId === '_unused') {
+      text = el.classList.contains('ced-collapsed')
+        ? 'CLICK TO EXPAND'
+        : 'UNUSED — CLICK TO COLLAPSE';
+    } else {
+      text = info ? info.type.toUpperCase().replace('_', ' ') + ' — ' +
+        info.token_count_str + ' TOKENS' : compId;
+    }
+    tooltip.textContent = text;
+    tooltip.style.display = 'block';
+    var rect = el.getBoundingClientRect();
+    var cRect = container.getBoundingClientRect();
+    tooltip.style.left = (rect.left - cRect.left + rect.width / 2 -
+      tooltip.offsetWidth / 2) + 'px';
+    tooltip.style.top = (rect.top - cRect.top - tooltip.offsetHeight - 8) + 'px';
+  });
+  container.addEventListener('mouseout', function(e) {
+    var el = componentFromEvent(e);
+    if (!el || (e.relatedTarget && el.contains(e.relatedTarget))) return;
+    tooltip.style.display = 'none';
+  });
+
+  // Click → Toggle unused collapse OR open modal (skip if dragging)
+  container.addEventListener('click', function(e) {
+    var el = componentFromEvent(e);
+    if (!el || dragState.isDragging) return;
+
+    var compId = el.getAttribute('data-comp-id');
+    if (compId === '_unused') {
+      el.classList.toggle('ced-collapsed');
+      return;
+    }
+    var info = data[compId];
+    if (!info) return;
+    showModal(info);
+  });
+
+  // Mousedown → Start potential drag
+  container.addEventListener('mousedown', function(e) {
+    if (e.button !== 0) return;
+    var el = componentFromEvent(e);
+    if (el) handleDragStart(el, e);
+  });
 
   // Close modal on overlay click
-  if (modal) {{
-    modal.addEventListener('click', function(e) {{
-      if (e.target === modal) cedCloseModal_{uid}();
-    }});
-  }}
-
-  function escapeHtml(str) {{
-    var div = document.createElement('div');
-    div.textContent = str;
-    return div.innerHTML;
-  }}
-}})();
+  if (modal) {
+    modal.addEventListener('click', function(e) {
+      if (e.target === modal) closeModal();
+    });
+  }
+};
 """
 
 
+def _fill_type_maps(template: str) -> str:
+    """Substitute the JSON-encoded per-type palette maps into ``template``."""
+    for sentinel, mapping in (
+        ("__COLOR_MAP__", COMPONENT_COLORS),
+        ("__TEXT_COLOR_MAP__", TEXT_COLORS),
+        ("__LABEL_MAP__", COMPONENT_LABELS),
+        ("__ICON_MAP__", COMPONENT_ICONS),
+    ):
+        template = template.replace(
+            sentinel, json.dumps({ct.value: mapping[ct] for ct in ComponentType})
+        )
+    return template
+
+
+_JS_STATIC = _fill_type_maps(_JS_STATIC)
+_JS_VERSION = hashlib.blake2b(_JS_STATIC.encode(), digest_size=6).hexdigest()
+_JS_STATIC = _JS_STATIC.replace("__CED_MAPS", "__CED_MAPS_" + _JS_VERSION).replace(
+    "cedInit", "cedInit_" + _JS_VERSION
+)
+_JS_BOOTSTRAP = "cedInit_" + _JS_VERSION + "('%s');"
+
+
+class ContextBuilder:
+    """Stateful editor for building and visualizing LLM context windows.
+
+    ContextBuilder provides:
+    - Neo-brutalist visualization in Jupyter notebooks
+    - Two-panel view with Available resources and Context Builder
+    - Drag-and-drop between panels to select/deselect items
+    - In-browser editing with Save button persistence
+    - Export of modified traces
+
+    Parameters
+    ----------
+    trace : ContextTrace, optional
+        The trace data to visualize. Can be None if only using resources.
+    context_limit : int
+        Maximum context window size in tokens.
+    layout : str
+        Layout algorithm: "vertical" (default).
+    resources : List[ContextResource], optional
+        Resource pools to show in Available panel.
+
+    Interactions
+    ------------
+    - Hover: Tooltip with component type and token count
+    - Click: Modal with full content and metadata
+    - Click on text in modal: Switch to edit mode with Save button
+    - Drag items: Move between Available and Context panels
+
+    Examples
+    --------
+    >>> rag = ContextResource.from_chroma(collection, ResourceType.RAG)
+    >>> rag.query(query_texts=["How do I..."], n_results=10)
+    >>> rag.select(["doc_1", "doc_2"])
+    >>>
+    >>> builder = ContextBuilder(resources=[rag])
+    >>> builder.display()
+    >>> # After dragging items and clicking Save...
+    >>> builder.apply_selections()
+    >>> new_trace = builder.get_trace()
+    """
+
+    def __init__(
+        self,
+        trace: Optional[ContextTrace] = None,
+        context_limit: int = 128_000,
+        layout: str = "vertical",
+        resources: Optional[List["ContextResource"]] = None,
+    ) -> None:
+        # Initialize trace (create empty if not provided)
+        if trace is None:
+            trace = ContextTrace(
+                context_limit=context_limit,
+                components=[],
+                total_tokens=0,
+            )
+        self._original_trace = trace  # Immutable reference
+        self._working_trace = _copy_trace(trace)  # Mutable copy for edits
+        self._edits: dict = {}  # Track edit history
+        self._reorder: Optional[List[str]] = None  # Track reorder history
+        self.context_limit = context_limit or trace.context_limit
+        self.layout = layout.lower()
+        self._resources = resources or []
+        self._uid = uuid.uuid4().hex[:12]
+        self._pending_selections: dict = {}  # Track pending selection changes
+        self._index: dict = {}  # component id -> position in working components
+        self._reindex()
+        self._component_json: dict = {}  # component id -> (key, JSON head, content entry)
+        self._div_cache: dict = {}  # component id -> (key, rendered layout div)
+
+    @property
+    def trace(self) -> ContextTrace:
+        """Return the working trace (for backward compatibility)."""
+        return self._working_trace
+
+    def get_trace(self) -> ContextTrace:
+        """Return a copy of the current working trace.
+
+        Returns
+        -------
+        ContextTrace
+            A new ContextTrace object with all current edits applied.
+        """
+        return _copy_trace(self._working_trace)
+
+    def apply_edit(self, component_id: str, new_content: str) -> None:
+        """Edit a component's content and recount tokens.
+
+        Parameters
+        ----------
+        component_id : str
+            The ID of the component to edit.
+        new_content : str
+            The new content for the component.
+
+        Raises
+        ------
+        KeyError
+            If the component_id is not found.
+        """
+        idx = self._component_position(component_id)
+        comp = self._working_trace.components[idx]
+        old_content = comp.content
+        old_tokens = comp.token_count
+        new_tokens = self._count_tokens(new_content)
+
+        # Update component
+        # Create new component with updated values (dataclass is immutable)
+        self._working_trace.components[idx] = ContextComponent(
+            id=comp.id,
+            type=comp.type,
+            content=new_content,
+            token_count=new_tokens,
+            metadata=comp.metadata,
+        )
+
+        # Update total tokens
+        self._working_trace.total_tokens += new_tokens - old_tokens
+
+        # Track edit
+        self._edits[component_id] = {
+            "original": old_content,
+            "edited": new_content,
+            "original_tokens": old_tokens,
+            "new_tokens": new_tokens,
+        }
+
+    def _reindex(self) -> None:
+        """Rebuild the component id -> position map (first occurrence wins)."""
+        index: dict = {}
+        for i, comp in enumerate(self._working_trace.components):
+            index.setdefault(comp.id, i)
+        self._index = index
+
+    def _component_position(self, component_id: str) -> int:
+        """Return the position of a component in the working trace.
+
+        The index is validated on every lookup and rebuilt if the component
+        list was changed behind the builder's back (e.g. via ``trace``).
+
+        Raises
+        ------
+        KeyError
+            If the component_id is not found.
+        """
+        components = self._working_trace.components
+        idx = self._index.get(component_id)
+        if idx is None or idx >= len(components) or components[idx].id != component_id:
+            self._reindex()
+            idx = self._index.get(component_id)
+            if idx is None:
+                raise KeyError(f"Component '{component_id}' not found")
+        return idx
+
+    def apply_reorder(self, new_order: List[str]) -> None:
+        """Reorder components according to the given order.
+
+        Parameters
+        ----------
+        new_order : List[str]
+            List of component IDs in the desired order.
+        """
+        # Build a map of id -> component
+        comp_map = {c.id: c for c in self._working_trace.components}
+
+        # Reorder components
+        reordered = []
+        for comp_id in new_order:
+            if comp_id in comp_map:
+                reordered.append(comp_map[comp_id])
+
+        # Add any components not in new_order (shouldn't happen, but be safe)
+        new_order_set = set(new_order)
+        if not comp_map.keys() <= new_order_set:
+            for comp in self._working_trace.components:
+                if comp.id not in new_order_set:
+                    reordered.append(comp)
+
+        self._working_trace.components = reordered
+        self._reorder = new_order
+        self._reindex()
+
+    def reset(self) -> None:
+        """Reset to the original trace, discarding all edits."""
+        self._working_trace = _copy_trace(self._original_trace)
+        self._edits = {}
+        self._reorder = None
+        self._reindex()
+
+    def has_changes(self) -> bool:
+        """Check if any edits have been made.
+
+        Returns
+        -------
+        bool
+            True if the trace has been modified.
+        """
+        return bool(self._edits) or self._reorder is not None
+
+    def to_json(self, path: str) -> None:
+        """Save the working trace to a JSON file.
+
+        Parameters
+        ----------
+        path : str
+            File path to save to.
+        """
+        self._working_trace.to_json(path)
+
+    def _count_tokens(self, content: str) -> int:
+        """Count tokens in content (memoized, see :func:`count_tokens`)."""
+        return count_tokens(content)
+
+    @property
+    def resources(self) -> List["ContextResource"]:
+        """Return the list of resources."""
+        return self._resources
+
+    def apply_selections(self, selections: Optional[dict] = None) -> None:
+        """Apply selection changes from browser to resources.
+
+        This method updates each resource's selected_ids based on
+        the selections made via drag-and-drop in the browser.
+
+        Parameters
+        ----------
+        selections : dict, optional
+            Dict mapping resource_name -> list of selected item IDs.
+            If not provided, uses pending selections from _pending_selections.
+        """
+        if selections is None:
+            selections = self._pending_selections
+
+        for resource in self._resources:
+            if resource.name in selections:
+                resource.selected_ids = set(selections[resource.name])
+
+        # Rebuild components from selected resource items
+        self._rebuild_components_from_resources()
+        self._pending_selections = {}
+
+    def _rebuild_components_from_resources(self) -> None:
+        """Rebuild trace components from currently selected resource items."""
+        # Keep non-resource components (system prompt, user message, etc.)
+        resource_types = self._resource_component_types()
+        components = []
+        total_tokens = 0
+        for c in self._working_trace.components:
+            if c.type not in resource_types:
+                components.append(c)
+                total_tokens += c.token_count
+
+        # Append selected items from resources, accumulating the total as we go
+        for resource in self._resources:
+            for c in resource.to_components():
+                components.append(c)
+                total_tokens += c.token_count
+
+        self._working_trace.components = components
+        self._working_trace.total_tokens = total_tokens
+        self._reindex()
+
+    def _resource_component_types(self) -> frozenset:
+        """Component types that are owned by the attached resources."""
+        return frozenset(r.resource_type.to_component_type() for r in self._resources)
+
+    def _repr_html_(self) -> str:
+        """Jupyter auto-display."""
+        return self.to_html()
+
+    def display(self) -> None:
+        """Display in IPython/Jupyter."""
+        from IPython.display import HTML
+        from IPython.display import display as ipy_display
+
+        ipy_display(HTML(self.to_html()))
+
+    def to_html(self) -> str:
+        """Generate the full HTML string."""
+        uid = self._uid
+        # Every section appends its fragments to this one buffer; it is
+        # joined exactly once at the end. The fixed wrapper markup around the
+        # body comes from the shell templates.
+        parts = [_SHELL_HEAD_TMPL % (uid, self._css())]
+
+        if self._resources:
+            self._resources_panel_into(parts, uid)
+        else:
+            self._context_window_into(parts, uid)
+
+        parts.append(
+            _SHELL_TAIL_TMPL
+            % (uid, self._modal_html(uid), self._component_data_script(uid), self._js(uid))
+        )
+        return "\n".join(parts)
+
+    # ------------------------------------------------------------------ CSS
+    def _css(self) -> str:
+        return _CSS
+
+    # ------------------------------------------------------ Context window
+    def _context_window_into(self, parts: List[str], uid: str) -> None:
+        """Append the single-panel context window to ``parts``."""
+        total = self.trace.total_tokens
+        limit = self.context_limit
+        pct = round(total / limit * 100) if limit else 0
+        token_str = f"{_fmt_tokens(total)} / {_fmt_tokens(limit)} TOKENS ({pct}%)"
+
+        parts.append('<div class="ced-context-window">')
+        parts.append('<span class="ced-window-label">Context Builder</span>')
+        parts.append(f'<span class="ced-token-counter">{token_str}</span>')
+
+        # Vertical layout
+        parts.append(f'<div class="ced-vertical" id="ced-vlayout-{uid}">')
+        items = compute_vertical_layout(self.trace)
+        # Score badges for RAG docs, rendered once per component id. First
+        # occurrence wins, matching the order components are listed in.
+        badges: dict = {}
+        for comp in self.trace.components:
+            if comp.id not in badges:
+                sc = comp.metadata.get("chroma_score")
+                badges[comp.id] = "" if sc is None else _SCORE_BADGE_SPAN_TMPL % (sc,)
+        # A div only depends on its id and the values in ``key``, so divs are
+        # reused across renders and only components that changed are rebuilt
+        cache = self._div_cache
+        fresh = {}
+        for item in items:
+            badge = badges.get(item["id"], "")
+            key = (item["type"], item["token_count"], item["height"], badge)
+            cached = cache.get(item["id"])
+            if cached is not None and cached[0] == key:
+                div = cached[1]
+            else:
+                div = self._component_div(item, badge)
+            fresh[item["id"]] = (key, div)
+            parts.append(div)
+        self._div_cache = fresh
+        parts.append("</div>")
+
+        parts.append("</div>")
+
+    def _component_div(self, item: dict, score_badge: str = "") -> str:
+        """Render a single component div for vertical layout.
+
+        Parameters
+        ----------
+        item : dict
+            Layout item from ``compute_vertical_layout``.
+        score_badge : str
+            Rendered score badge for the component, or ``""`` for none.
+        """
+        height = item.get("height", 40)
+
+        if item["is_unused"]:
+            return _UNUSED_COMP_TMPL % (height, _fmt_tokens(item["token_count"]))
+
+        comp_type = item["type"]
+        css_cls, icon, label, _ = _COMPONENT_RENDER.get(comp_type, _NO_RENDER)
+        comp_id = _escape_cached(item["id"])
+
+        # One join over literal chunks is cheaper than a many-field f-string here,
+        # and this runs once per component per render.
+        return "".join(
+            (
+                '<div class="ced-component ',
+                css_cls,
+                '" style="height:',
+                str(height),
+                'px;" data-comp-id="',
+                comp_id,
+                '">',
+                score_badge,
+                '<span class="ced-left"><span class="ced-icon">',
+                icon,
+                '</span><span class="ced-label">',
+                label,
+                '</span></span><span class="ced-tokens">',
+                _fmt_tokens(item["token_count"]),
+                "</span></div>",
+            )
+        )
+
+    # -------------------------------------------------------- Resources panel
+    def _resources_panel_into(self, parts: List[str], uid: str) -> None:
+        """Append the two-panel view (Available resources, Context Builder) to ``parts``."""
+        resource_types = self._resource_component_types()
+        esc = _escape_cached
+
+        # Left panel: Available items from all resources
+        parts.append(
+            f'<div class="ced-two-panel" id="ced-panels-{uid}">'
+            f'<div class="ced-panel ced-available-panel" id="ced-available-{uid}">'
+            f'<div class="ced-panel-header">Available</div>'
+            f'<div class="ced-panel-content" id="ced-available-content-{uid}">'
+        )
+        for resource in self._resources:
+            res_name = esc(resource.name)
+            # Resource header
+            parts.append(
+                f'<div class="ced-resource-header" data-resource="{res_name}">'
+                f"{res_name} ({len(resource.items)} items)"
+                f"</div>"
+            )
+            res_type_color = _COMPONENT_RENDER.get(
+                resource.resource_type.to_component_type(), _NO_RENDER
+            )[3]
+            # Highest score first (a linear pass for query() results, see items_by_score)
+            selected_ids = resource.selected_ids
+            for item in resource.items_by_score:
+                is_selected = item.id in selected_ids
+                item_id = esc(item.id)
+                parts.append(
+                    _AVAILABLE_ITEM_TMPL
+                    % (
+                        "ced-selected" if is_selected else "ced-unselected",
+                        item_id,
+                        res_name,
+                        res_type_color,
+                        res_type_color,
+                        _SCORE_BADGE_TMPL % item.score if item.score is not None else "",
+                        item_id,
+                        _fmt_tokens(item.token_count),
+                        "\u2713" if is_selected else "",
+                    )
+                )
+
+        parts.append(
+            f"</div>"
+            f"</div>"
+            f'<div class="ced-panel-divider">'
+            f'<button class="ced-btn ced-save-selections" id="ced-save-btn-{uid}" '
+            f'style="display:none;">Save</button>'
+            f"</div>"
+        )
+
+        # Right panel: Selected items + trace components. The header shows the
+        # selected total, which is accumulated while the items are rendered and
+        # written into this reserved slot afterwards.
+        header_slot = len(parts)
+        parts.append("")
+        total_selected = 0
+
+        # Add selected resource items
+        for resource in self._resources:
+            res_name = esc(resource.name)
+            res_type_color = _COMPONENT_RENDER.get(
+                resource.resource_type.to_component_type(), _NO_RENDER
+            )[3]
+            for item in resource.selected_items:
+                total_selected += item.token_count
+                item_id = esc(item.id)
+                parts.append(
+                    _SELECTED_ITEM_TMPL
+                    % (
+                        item_id,
+                        res_name,
+                        res_type_color,
+                        _SCORE_BADGE_TMPL % item.score if item.score is not None else "",
+                        item_id,
+                        _fmt_tokens(item.token_count),
+                    )
+                )
+
+        # Add non-resource trace components
+        for comp in self._working_trace.components:
+            if comp.type not in resource_types:
+                css_cls, icon, label, _ = _COMPONENT_RENDER.get(comp.type, _NO_RENDER)
+                total_selected += comp.token_count
+                parts.append(
+                    _TRACE_ITEM_TMPL
+                    % (css_cls, esc(comp.id), icon, label, _fmt_tokens(comp.token_count))
+                )
+
+        parts.append("</div></div></div>")
+
+        pct = round(total_selected / self.context_limit * 100) if self.context_limit else 0
+        token_str = (
+            f"{_fmt_tokens(total_selected)} / {_fmt_tokens(self.context_limit)} TOKENS ({pct}%)"
+        )
+        parts[header_slot] = (
+            f'<div class="ced-panel ced-context-panel" id="ced-context-{uid}">'
+            f'<div class="ced-panel-header">Context Builder '
+            f'<span class="ced-token-badge">{token_str}</span></div>'
+            f'<div class="ced-panel-content" id="ced-context-content-{uid}">'
+        )
+
+    # -------------------------------------------------------------- Modal
+    def _modal_html(self, uid: str) -> str:
+        return _scoped_modal(uid)
+
+    # ------------------------------------------------- Component data JSON
+    def _component_data_script(self, uid: str) -> str:
+        """Embed component and resource data as JSON for interaction modes.
+
+        The payloads go in ``application/json`` script blocks that the widget
+        script reads with ``JSON.parse``, which is cheaper for the browser
+        than evaluating them as object literals. Component contents, usually
+        the bulk of the payload, have their own block that the script only
+        parses when a modal is first opened.
+        """
+        # Each component is encoded field by field straight into its entry, so
+        # no per-component list (or outer dict of them) is built just to be
+        # serialized. The output is the JSON of the equivalent dict; orjson is
+        # used for the values when it is installed.
+        # The encoded head (everything but the metadata) and content entry are
+        # reused across renders while the component's type, content and count
+        # are unchanged, so after an edit only the edited content is re-encoded.
+        encode = _orjson_dumps if HAS_ORJSON else _json_dumps
+        cache = self._component_json
+        fresh = {}
+        entries = []
+        content_entries = []
+        for comp in self._working_trace.components:
+            key = (comp.type, comp.content, comp.token_count)
+            cached = cache.get(comp.id)
+            if cached is not None and cached[0] == key:
+                _, head, content_entry = cached
+            else:
+                comp_id = encode(comp.id)
+                head = _COMPONENT_JSON_HEAD_TMPL % (
+                    comp_id,
+                    encode(comp.type.value),
+                    encode(comp.token_count),
+                    encode(_fmt_tokens(comp.token_count)),
+                )
+                content_entry = _COMPONENT_CONTENT_TMPL % (comp_id, encode(comp.content))
+            fresh[comp.id] = (key, head, content_entry)
+            if comp.metadata:
+                entries.append(head + ", " + encode(comp.metadata) + "]")
+            else:
+                entries.append(head + "]")
+            content_entries.append(content_entry)
+        # Only the current components are kept, so removed ones do not linger
+        self._component_json = fresh
+        data_json = ", ".join(entries)
+        content_json = ", ".join(content_entries)
+
+        # Also embed resource data
+        resources_data = {}
+        for resource in self._resources:
+            resources_data[resource.name] = {
+                "name": resource.name,
+                "type": resource.resource_type.value,
+                "selected_ids": list(resource.selected_ids),
+                "items": [
+                    {
+                        "id": item.id,
+                        "content": item.content,
+                        "token_count": item.token_count,
+                        "token_count_str": _fmt_tokens(item.token_count),
+                        "score": item.score,
+                    }
+                    for item in resource.items
+                ],
+            }
+
+        return (
+            f'<script type="application/json" id="ced-data-{uid}">'
+            f"{_script_json('{' + data_json + '}')}</script>\n"
+            f'<script type="application/json" id="ced-content-{uid}">'
+            f"{_script_json('{' + content_json + '}')}</script>\n"
+            f'<script type="application/json" id="ced-resources-{uid}">'
+            f"{_script_json(encode(resources_data))}</script>"
+        )
+
+    # ---------------------------------------------------------- JavaScript
+    def _js(self, uid: str) -> str:
+        return _JS_STATIC + _JS_BOOTSTRAP % uid
+
+
 # Backward compatibility alias
 ContextWindow = ContextBuilder
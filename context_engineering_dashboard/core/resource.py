@@ -6,25 +6,245 @@ that can be included in the context window. It supports multiple resource
 types (RAG, Examples, Chat History, etc.) and integrates with Chroma.
 """
 
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Any, Dict, List, Optional, Set
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 from context_engineering_dashboard.core.trace import ComponentType, ContextComponent
 
+try:
+    import tiktoken
+
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+try:
+    # Always present alongside chromadb, which is what query() talks to
+    import numpy as np
+except ImportError:
+    np = None
+
+FALLBACK_ENCODING = "cl100k_base"
+
+# Token counts are memoized in an LRU table of at most _COUNT_CACHE_SIZE
+# entries. Texts longer than _CACHE_MAX_CHARS are not kept as keys; they are
+# keyed by a 16-byte blake2b digest instead, so the table pins at most
+# _COUNT_CACHE_SIZE * _CACHE_MAX_CHARS (8M) characters.
+_CACHE_MAX_CHARS = 1024
+_COUNT_CACHE_SIZE = 8192
+
+# Set to True to persist token counts across sessions (see TokenCountCache)
+ENABLE_DISK_CACHE = False
+DISK_CACHE_PATH = Path.home() / ".cache" / "context_engineering_dashboard" / "tokens.sqlite"
+
+# Resolved encodings keyed by model name (and by FALLBACK_ENCODING itself)
+_ENCODING_CACHE: Dict[str, "tiktoken.Encoding"] = {}
+
+
+def _get_encoding(model: str) -> "tiktoken.Encoding":
+    """Return the tiktoken encoding for a model, resolving it only once."""
+    enc = _ENCODING_CACHE.get(model)
+    if enc is None:
+        try:
+            enc = tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Unknown model name: use the fallback encoding
+            enc = _ENCODING_CACHE.get(FALLBACK_ENCODING)
+            if enc is None:
+                enc = tiktoken.get_encoding(FALLBACK_ENCODING)
+                _ENCODING_CACHE[FALLBACK_ENCODING] = enc
+        _ENCODING_CACHE[model] = enc
+    return enc
+
+
+def _tokenize_counts(model: str, texts: List[str]) -> List[int]:
+    """Token counts straight from tiktoken; several texts share one batch call."""
+    enc = _get_encoding(model)
+    if len(texts) == 1:
+        return [len(enc.encode(texts[0]))]
+    return [len(tokens) for tokens in enc.encode_batch(texts, num_threads=os.cpu_count() or 1)]
+
+
+class TokenCountCache:
+    """Persistent token-count store backed by SQLite.
+
+    Counts are keyed by ``(model, sha256(text))`` so the same corpus is not
+    re-tokenized every time a notebook kernel restarts.
+
+    Parameters
+    ----------
+    path : str or Path
+        SQLite file to use. Parent directories are created if needed.
+    """
+
+    # Keys per SELECT ... IN (...); stays under SQLite's bound-parameter limit
+    _QUERY_CHUNK = 500
+
+    def __init__(self, path: Union[str, Path] = DISK_CACHE_PATH) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_counts ("
+                "model TEXT NOT NULL, key BLOB NOT NULL, count INTEGER NOT NULL, "
+                "PRIMARY KEY (model, key))"
+            )
+
+    def get(self, model: str, text: str) -> int:
+        """Return the token count for text, encoding and storing it on a miss."""
+        return self.get_many(model, [text])[0]
+
+    def get_many(self, model: str, texts: List[str]) -> List[int]:
+        """Return token counts for texts.
+
+        Stored counts are read in bulk; the misses are encoded in one batch
+        and written back in a single transaction.
+        """
+        keys = [hashlib.sha256(text.encode("utf-8", "surrogatepass")).digest() for text in texts]
+        found: Dict[bytes, int] = {}
+        distinct = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(distinct), self._QUERY_CHUNK):
+                chunk = distinct[start : start + self._QUERY_CHUNK]
+                rows = self._conn.execute(
+                    "SELECT key, count FROM token_counts WHERE model = ? AND key IN (%s)"
+                    % ", ".join("?" * len(chunk)),
+                    (model, *chunk),
+                ).fetchall()
+                found.update((bytes(key), int(count)) for key, count in rows)
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            counts = _tokenize_counts(model, list(missing.values()))
+            new_rows = list(zip(missing, counts))
+            found.update(new_rows)
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO token_counts (model, key, count) VALUES (?, ?, ?)",
+                    [(model, key, count) for key, count in new_rows],
+                )
+        return [found[key] for key in keys]
+
+    def close(self) -> None:
+        """Close the underlying SQLite connection."""
+        self._conn.close()
+
+
+_DISK_CACHE: Optional[TokenCountCache] = None
+
+
+def _get_disk_cache() -> TokenCountCache:
+    global _DISK_CACHE
+    if _DISK_CACHE is None:
+        _DISK_CACHE = TokenCountCache(DISK_CACHE_PATH)
+    return _DISK_CACHE
+
+
+def _encode_counts(model: str, texts: List[str]) -> List[int]:
+    """Encode texts and return their token counts, bypassing the memo table."""
+    if ENABLE_DISK_CACHE:
+        return _get_disk_cache().get_many(model, texts)
+    return _tokenize_counts(model, texts)
+
+
+_COUNT_CACHE: "OrderedDict[Tuple[str, Union[str, bytes]], int]" = OrderedDict()
+_COUNT_CACHE_LOCK = threading.Lock()
+
+
+def _count_key(model: str, text: str) -> Tuple[str, Union[str, bytes]]:
+    if len(text) <= _CACHE_MAX_CHARS:
+        return (model, text)
+    return (model, hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+
+
+def _count_many(model: str, texts: List[str]) -> List[int]:
+    """Return token counts for texts, encoding only those not already memoized.
+
+    Misses are encoded together (once per distinct text) and written back.
+    """
+    keys = [_count_key(model, text) for text in texts]
+    counts: List[Optional[int]] = []
+    misses: Dict[Tuple[str, Union[str, bytes]], List[int]] = {}
+    with _COUNT_CACHE_LOCK:
+        for i, key in enumerate(keys):
+            count = _COUNT_CACHE.get(key)
+            if count is None:
+                misses.setdefault(key, []).append(i)
+            else:
+                _COUNT_CACHE.move_to_end(key)
+            counts.append(count)
+    if misses:
+        positions = list(misses.values())
+        fresh = _encode_counts(model, [texts[group[0]] for group in positions])
+        with _COUNT_CACHE_LOCK:
+            for key, group, count in zip(misses, positions, fresh):
+                for i in group:
+                    counts[i] = count
+                _COUNT_CACHE[key] = count
+                _COUNT_CACHE.move_to_end(key)
+            while len(_COUNT_CACHE) > _COUNT_CACHE_SIZE:
+                _COUNT_CACHE.popitem(last=False)
+    return counts  # type: ignore[return-value]
+
 
 def count_tokens(text: str, model: str = "gpt-4") -> int:
-    """Count tokens in text using tiktoken if available."""
-    try:
-        import tiktoken
+    """Count tokens in text using tiktoken if available.
 
-        encoding = tiktoken.encoding_for_model(model)
-        return len(encoding.encode(text))
+    Counts are memoized, so repeated system prompts and boilerplate are only
+    encoded once; texts longer than ``_CACHE_MAX_CHARS`` are memoized by a
+    blake2b digest so the cache does not hold on to them. When
+    ``ENABLE_DISK_CACHE`` is True, misses are looked up in a persistent
+    :class:`TokenCountCache` before encoding.
+    """
+    if not HAS_TIKTOKEN:
+        return len(text) // 4
+    try:
+        return _count_many(model, [text])[0]
     except Exception:
         # Fallback: rough estimate of 4 chars per token
         return len(text) // 4
 
 
+def count_tokens_batch(texts: List[str], model: str = "gpt-4") -> List[int]:
+    """Count tokens for many texts, sharing the memo table with count_tokens.
+
+    Texts without a memoized count are encoded with a single multi-threaded
+    tiktoken call.
+    """
+    if not HAS_TIKTOKEN or not texts:
+        return [len(text) // 4 for text in texts]
+    try:
+        return _count_many(model, list(texts))
+    except Exception:
+        # A single bad text fails the whole batch; count individually instead
+        return [count_tokens(text, model) for text in texts]
+
+
+def _distances_to_scores(distances: List[float], n: int) -> List[float]:
+    """Convert L2 distances to similarity scores (0-1), rounded to 4 places.
+
+    Missing distances are treated as 0.0 and negative ones score 1.0.
+    """
+    padded = list(distances[:n]) + [0.0] * (n - len(distances))
+    if np is not None:
+        d = np.asarray(padded, dtype=np.float64)
+        return np.round(np.where(d >= 0, 1.0 / (1.0 + np.maximum(d, 0.0)), 1.0), 4).tolist()
+    return [round(1.0 / (1.0 + d) if d >= 0 else 1.0, 4) for d in padded]
+
+
+def _score_key(item: "ResourceItem") -> float:
+    return item.score if item.score is not None else 0
+
+
 class ResourceType(Enum):
     """Type of context resource pool.
 
@@ -39,17 +259,19 @@ class ResourceType(Enum):
 
     def to_component_type(self) -> ComponentType:
         """Map ResourceType to ComponentType for visualization."""
-        mapping = {
-            ResourceType.RAG: ComponentType.RAG,
-            ResourceType.EXAMPLE: ComponentType.EXAMPLE,
-            ResourceType.CHAT_HISTORY: ComponentType.CHAT_HISTORY,
-            ResourceType.SCRATCHPAD: ComponentType.SCRATCHPAD,
-            ResourceType.TOOL: ComponentType.TOOL,
-        }
-        return mapping[self]
+        return _RESOURCE_TO_COMPONENT[self]
 
 
-@dataclass
+_RESOURCE_TO_COMPONENT = {
+    ResourceType.RAG: ComponentType.RAG,
+    ResourceType.EXAMPLE: ComponentType.EXAMPLE,
+    ResourceType.CHAT_HISTORY: ComponentType.CHAT_HISTORY,
+    ResourceType.SCRATCHPAD: ComponentType.SCRATCHPAD,
+    ResourceType.TOOL: ComponentType.TOOL,
+}
+
+
+@dataclass(slots=True)
 class ResourceItem:
     """A single item in a resource pool.
 
@@ -145,12 +367,24 @@ class ContextResource:
     @property
     def selected_items(self) -> List[ResourceItem]:
         """Return items that are selected for the context window."""
-        return [item for item in self.items if item.id in self.selected_ids]
+        selected = self.selected_ids
+        return [item for item in self.items if item.id in selected]
+
+    @property
+    def items_by_score(self) -> List[ResourceItem]:
+        """Return items ordered by descending score (unscored items count as 0).
+
+        The ordering is not cached. :meth:`query` stores results nearest first,
+        which is already descending score, and ``sorted`` takes one linear
+        pass over ordered input.
+        """
+        return sorted(self.items, key=_score_key, reverse=True)
 
     @property
     def unselected_items(self) -> List[ResourceItem]:
         """Return items not selected for the context window."""
-        return [item for item in self.items if item.id not in self.selected_ids]
+        selected = self.selected_ids
+        return [item for item in self.items if item.id not in selected]
 
     @property
     def total_selected_tokens(self) -> int:
@@ -235,28 +469,36 @@ class ContextResource:
         # Convert to ResourceItems
         self.items = []
         if results and results.get("ids"):
-            ids = results["ids"][0] if results["ids"] else []
-            documents = results.get("documents", [[]])[0] if results.get("documents") else []
-            distances = results.get("distances", [[]])[0] if results.get("distances") else []
-            metadatas = results.get("metadatas", [[]])[0] if results.get("metadatas") else []
-
-            for i, doc_id in enumerate(ids):
-                content = documents[i] if i < len(documents) else ""
-                distance = distances[i] if i < len(distances) else 0.0
-                metadata = metadatas[i] if i < len(metadatas) else {}
-
-                # Convert L2 distance to similarity score (0-1)
-                score = 1.0 / (1.0 + distance) if distance >= 0 else 1.0
-
-                self.items.append(
-                    ResourceItem(
-                        id=str(doc_id),
-                        content=content,
-                        token_count=count_tokens(content),
-                        score=round(score, 4),
-                        metadata=metadata or {},
-                    )
+
+            def _first(key: str) -> list:
+                # Chroma returns one list per query text; we only use the first
+                value = results.get(key)
+                return value[0] if value else []
+
+            ids = _first("ids")
+            documents = _first("documents")
+            distances = _first("distances")
+            metadatas = _first("metadatas")
+
+            contents = [documents[i] if i < len(documents) else "" for i in range(len(ids))]
+            metadatas = [metadatas[i] if i < len(metadatas) else None for i in range(len(ids))]
+            # Counted in one batch; documents seen by earlier queries are memoized
+            token_counts = count_tokens_batch(contents)
+            # Scores are computed in one vectorized pass; every per-document
+            # column is aligned with ids, so items are built with a single zip
+            scores = _distances_to_scores(distances, len(ids))
+            self.items = [
+                ResourceItem(
+                    id=str(doc_id),
+                    content=content,
+                    token_count=token_count,
+                    score=score,
+                    metadata=metadata or {},
                 )
+                for doc_id, content, token_count, score, metadata in zip(
+                    ids, contents, token_counts, scores, metadatas
+                )
+            ]
 
         return results
 
@@ -269,10 +511,13 @@ class ContextResource:
             Components ready for inclusion in a ContextTrace.
         """
         comp_type = self.resource_type.to_component_type()
+        name = self.name
         components = []
 
         for item in self.selected_items:
-            metadata = {**item.metadata, "resource": self.name}
+            # One shallow copy per component; content is passed through by reference
+            metadata = dict(item.metadata)
+            metadata["resource"] = name
             if item.score is not None:
                 metadata["score"] = item.score
 
@@ -374,18 +619,20 @@ class ContextResource:
         ContextResource
             A static resource with the provided items.
         """
-        resource_items = []
-        for item in items:
-            content = item.get("content", "")
-            resource_items.append(
-                ResourceItem(
-                    id=item["id"],
-                    content=content,
-                    token_count=item.get("token_count", count_tokens(content)),
-                    score=item.get("score"),
-                    metadata=item.get("metadata", {}),
-                )
+        contents = [item.get("content", "") for item in items]
+        # Items that do not bring their own count are counted in one batch
+        missing = [i for i, item in enumerate(items) if "token_count" not in item]
+        counted = dict(zip(missing, count_tokens_batch([contents[i] for i in missing])))
+        resource_items = [
+            ResourceItem(
+                id=item["id"],
+                content=contents[i],
+                token_count=counted[i] if i in counted else item["token_count"],
+                score=item.get("score"),
+                metadata=item.get("metadata", {}),
             )
+            for i, item in enumerate(items)
+        ]
 
         return cls(
             name=name,
@@ -5,11 +5,72 @@ These dataclasses define the schema for capturing and storing
 traces from LLM calls and context assembly.
 """
 
+import functools
 import json
 from dataclasses import dataclass, field
 from enum import Enum
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+
+if TYPE_CHECKING:
+    import numpy as np
+
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def _json_default(obj: Any) -> Any:
+    """Serialize array-likes (e.g. numpy embeddings) as JSON lists."""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _write_json(data: Dict[str, Any], path: Union[str, Path]) -> None:
+    """Write ``data`` to ``path`` as indented JSON, using orjson when installed.
+
+    numpy arrays are written as plain lists; orjson encodes them natively.
+    """
+    if HAS_ORJSON:
+        Path(path).write_bytes(
+            orjson.dumps(
+                data,
+                default=_json_default,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+            )
+        )
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, default=_json_default)
+
+
+def _read_json(path: Union[str, Path]) -> Any:
+    """Read a JSON file written by :func:`_write_json`."""
+    raw = Path(path).read_bytes()
+    return orjson.loads(raw) if HAS_ORJSON else json.loads(raw)
+
+
+_SCHEMA_PATH = Path(__file__).parent.parent.parent / "schemas" / "trace-schema.json"
+
+
+@functools.lru_cache(maxsize=1)
+def _get_trace_validator() -> Any:
+    """Build the validator for the bundled schema once; None if it is missing.
+
+    Raises ImportError when jsonschema is not installed (not cached).
+    """
+    import jsonschema
+
+    if not _SCHEMA_PATH.exists():
+        return None
+    schema = json.loads(_SCHEMA_PATH.read_text(encoding="utf-8"))
+    validator_cls = jsonschema.validators.validator_for(schema)
+    validator_cls.check_schema(schema)
+    return validator_cls(schema)
 
 
 class ComponentType(Enum):
@@ -24,7 +85,11 @@ class ComponentType(Enum):
     SCRATCHPAD = "scratchpad"
 
 
-@dataclass
+# Enum.value goes through a descriptor; serialization reads it per component
+_COMPONENT_TYPE_VALUES = {ct: ct.value for ct in ComponentType}
+
+
+@dataclass(slots=True)
 class ContextComponent:
     """A single component in the context window."""
 
@@ -37,7 +102,7 @@ class ContextComponent:
     def to_dict(self) -> Dict[str, Any]:
         return {
             "id": self.id,
-            "type": self.type.value,
+            "type": _COMPONENT_TYPE_VALUES[self.type],
             "content": self.content,
             "token_count": self.token_count,
             "metadata": self.metadata,
@@ -54,7 +119,7 @@ class ContextComponent:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class ToolCall:
     """A tool invocation by the LLM."""
 
@@ -176,14 +241,10 @@ class Trace:
             True if valid, False otherwise.
         """
         try:
-            import jsonschema
-
-            # Load bundled schema
-            schema_path = Path(__file__).parent.parent.parent / "schemas" / "trace-schema.json"
-            if schema_path.exists():
-                with open(schema_path) as f:
-                    schema = json.load(f)
-                jsonschema.validate(self.to_dict(), schema)
+            # The bundled schema is loaded and compiled on first use only
+            validator = _get_trace_validator()
+            if validator is not None:
+                validator.validate(self.to_dict())
             return True
         except ImportError:
             if strict:
@@ -196,24 +257,33 @@ class Trace:
 
     def to_json(self, path: Union[str, Path]) -> None:
         """Save trace to JSON file."""
-        with open(path, "w") as f:
-            json.dump(self.to_dict(), f, indent=2)
+        _write_json(self.to_dict(), path)
 
     @classmethod
     def from_json(cls, path: Union[str, Path]) -> "Trace":
         """Load trace from JSON file."""
-        with open(path) as f:
-            return cls.from_dict(json.load(f))
+        return cls.from_dict(_read_json(path))
 
 
-@dataclass
+def _embedding_list(embedding: Any) -> List[float]:
+    """Return an embedding as a list of floats (numpy arrays via ``tolist``)."""
+    return embedding.tolist() if hasattr(embedding, "tolist") else list(embedding)
+
+
+@dataclass(slots=True, eq=False)
 class EmbeddingTrace:
-    """Trace of an embedding model call."""
+    """Trace of an embedding model call.
+
+    ``embedding`` may also be a 1-D numpy array (e.g. float32), which avoids
+    boxing every value while the trace is held in memory. ``to_dict`` always
+    returns it as a list of numbers, and equality compares the values, so a
+    list and an array holding the same numbers are equal.
+    """
 
     provider: str
     model: str
     input_text: str
-    embedding: List[float]
+    embedding: Union[List[float], "np.ndarray"]
     latency_ms: float = 0.0
 
     def to_dict(self) -> Dict[str, Any]:
@@ -221,10 +291,20 @@ class EmbeddingTrace:
             "provider": self.provider,
             "model": self.model,
             "input_text": self.input_text,
-            "embedding": self.embedding,
+            "embedding": _embedding_list(self.embedding),
             "latency_ms": self.latency_ms,
         }
 
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, EmbeddingTrace):
+            return NotImplemented
+        return (self.provider, self.model, self.input_text, self.latency_ms) == (
+            other.provider,
+            other.model,
+            other.input_text,
+            other.latency_ms,
+        ) and _embedding_list(self.embedding) == _embedding_list(other.embedding)
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "EmbeddingTrace":
         return cls(
@@ -303,14 +383,12 @@ class ContextTrace:
 
     def to_json(self, path: Union[str, Path]) -> None:
         """Save trace to JSON file."""
-        with open(path, "w") as f:
-            json.dump(self.to_dict(), f, indent=2)
+        _write_json(self.to_dict(), path)
 
     @classmethod
     def from_json(cls, path: Union[str, Path]) -> "ContextTrace":
         """Load trace from JSON file."""
-        with open(path) as f:
-            return cls.from_dict(json.load(f))
+        return cls.from_dict(_read_json(path))
 
     @property
     def unused_tokens(self) -> int:
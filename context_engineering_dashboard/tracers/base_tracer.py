@@ -1,11 +1,23 @@
 """Base tracer abstract class for provider tracers."""
 
+import uuid
 from abc import ABC, abstractmethod
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Optional, Tuple
 
 from context_engineering_dashboard.core.trace import ContextTrace
 
 
+def capture_stamp() -> Tuple[str, str]:
+    """Return a ``(timestamp, session_id)`` pair for a newly captured call.
+
+    Tracers stamp once at capture time and reuse the pair for every trace
+    built from that capture, so rebuilding a trace is deterministic and
+    avoids a clock read and UUID generation per build.
+    """
+    return datetime.now(timezone.utc).isoformat(), str(uuid.uuid4())[:8]
+
+
 class BaseTracer(ABC):
     """Abstract base class for provider tracers.
 
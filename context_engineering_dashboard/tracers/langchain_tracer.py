@@ -1,7 +1,5 @@
 """LangChain tracer — callback handler integrating with LangChain's callback system."""
 
-import uuid
-from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional, Sequence
 
 from context_engineering_dashboard.core.trace import (
@@ -10,7 +8,7 @@ from context_engineering_dashboard.core.trace import (
     ContextTrace,
     Trace,
 )
-from context_engineering_dashboard.tracers.base_tracer import BaseTracer
+from context_engineering_dashboard.tracers.base_tracer import BaseTracer, capture_stamp
 
 
 def _count_tokens(text: str) -> int:
@@ -49,11 +47,14 @@ def _make_handler_class() -> type:
             prompts: List[str],
             **kwargs: Any,
         ) -> None:
+            timestamp, session_id = capture_stamp()
             self._llm_starts.append(
                 {
                     "serialized": serialized,
                     "prompts": prompts,
                     "kwargs": kwargs,
+                    "timestamp": timestamp,
+                    "session_id": session_id,
                 }
             )
 
@@ -103,7 +104,16 @@ def _make_handler_class() -> type:
             pass
 
         def build_trace(self, context_limit: int = 128_000) -> ContextTrace:
-            """Build a ContextTrace from collected callback data."""
+            """Build a ContextTrace from collected callback data.
+
+            The trace is stamped with the time and session of the last LLM
+            call, or with the build time if no LLM call was captured.
+            """
+            if self._llm_starts:
+                timestamp = self._llm_starts[-1]["timestamp"]
+                session_id = self._llm_starts[-1]["session_id"]
+            else:
+                timestamp, session_id = capture_stamp()
             components: List[ContextComponent] = []
 
             # Add retriever results as RAG components
@@ -148,8 +158,8 @@ def _make_handler_class() -> type:
                     model=model,
                     messages=[{"role": "user", "content": p} for p in last_start["prompts"]],
                     response=response_text,
-                    timestamp=datetime.now(timezone.utc).isoformat(),
-                    session_id=str(uuid.uuid4())[:8],
+                    timestamp=timestamp,
+                    session_id=session_id,
                 )
 
             total_tokens = sum(c.token_count for c in components)
@@ -159,8 +169,8 @@ def _make_handler_class() -> type:
                 components=components,
                 total_tokens=total_tokens,
                 trace=trace,
-                timestamp=datetime.now(timezone.utc).isoformat(),
-                session_id=str(uuid.uuid4())[:8],
+                timestamp=timestamp,
+                session_id=session_id,
             )
 
     return _TracerCallbackHandler
@@ -7,8 +7,6 @@ on exit.
 """
 
 import time
-import uuid
-from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
 from context_engineering_dashboard.core.trace import (
@@ -18,7 +16,7 @@ from context_engineering_dashboard.core.trace import (
     ToolCall,
     Trace,
 )
-from context_engineering_dashboard.tracers.base_tracer import BaseTracer
+from context_engineering_dashboard.tracers.base_tracer import BaseTracer, capture_stamp
 
 DEFAULT_CONTEXT_LIMIT = 128_000
 
@@ -145,11 +143,14 @@ class LiteLLMTracer(BaseTracer):
 
     def _capture(self, kwargs: Dict[str, Any], response: Any, elapsed_ms: float) -> None:
         """Capture a single API call."""
+        timestamp, session_id = capture_stamp()
         self._captures.append(
             {
                 "kwargs": kwargs,
                 "response": response,
                 "elapsed_ms": elapsed_ms,
+                "timestamp": timestamp,
+                "session_id": session_id,
             }
         )
 
@@ -158,6 +159,8 @@ class LiteLLMTracer(BaseTracer):
         kwargs = capture["kwargs"]
         response = capture["response"]
         elapsed_ms = capture["elapsed_ms"]
+        timestamp = capture["timestamp"]
+        session_id = capture["session_id"]
 
         messages = kwargs.get("messages", [])
         model = kwargs.get("model", "unknown")
@@ -232,8 +235,8 @@ class LiteLLMTracer(BaseTracer):
             tool_calls=tool_calls_list,
             usage=usage,
             latency_ms=elapsed_ms,
-            timestamp=datetime.now(timezone.utc).isoformat(),
-            session_id=str(uuid.uuid4())[:8],
+            timestamp=timestamp,
+            session_id=session_id,
         )
 
         return ContextTrace(
@@ -241,6 +244,6 @@ class LiteLLMTracer(BaseTracer):
             components=components,
             total_tokens=total_tokens,
             trace=trace,
-            timestamp=datetime.now(timezone.utc).isoformat(),
-            session_id=str(uuid.uuid4())[:8],
+            timestamp=timestamp,
+            session_id=session_id,
         )
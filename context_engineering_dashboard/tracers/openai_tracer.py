@@ -1,8 +1,6 @@
 """OpenAI tracer — captures chat completion calls via monkey-patching."""
 
 import time
-import uuid
-from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
 from context_engineering_dashboard.core.trace import (
@@ -12,7 +10,7 @@ from context_engineering_dashboard.core.trace import (
     ToolCall,
     Trace,
 )
-from context_engineering_dashboard.tracers.base_tracer import BaseTracer
+from context_engineering_dashboard.tracers.base_tracer import BaseTracer, capture_stamp
 
 # Known context window limits per model
 MODEL_CONTEXT_LIMITS: Dict[str, int] = {
@@ -117,11 +115,14 @@ class OpenAITracer(BaseTracer):
 
     def _capture(self, kwargs: Dict[str, Any], response: Any, elapsed_ms: float) -> None:
         """Capture a single API call."""
+        timestamp, session_id = capture_stamp()
         self._captures.append(
             {
                 "kwargs": kwargs,
                 "response": response,
                 "elapsed_ms": elapsed_ms,
+                "timestamp": timestamp,
+                "session_id": session_id,
             }
         )
 
@@ -130,6 +131,8 @@ class OpenAITracer(BaseTracer):
         kwargs = capture["kwargs"]
         response = capture["response"]
         elapsed_ms = capture["elapsed_ms"]
+        timestamp = capture["timestamp"]
+        session_id = capture["session_id"]
 
         messages = kwargs.get("messages", [])
         model = kwargs.get("model", "unknown")
@@ -208,8 +211,8 @@ class OpenAITracer(BaseTracer):
             tool_calls=tool_calls_list,
             usage=usage,
             latency_ms=elapsed_ms,
-            timestamp=datetime.now(timezone.utc).isoformat(),
-            session_id=str(uuid.uuid4())[:8],
+            timestamp=timestamp,
+            session_id=session_id,
         )
 
         return ContextTrace(
@@ -217,6 +220,6 @@ class OpenAITracer(BaseTracer):
             components=components,
             total_tokens=total_tokens,
             trace=trace,
-            timestamp=datetime.now(timezone.utc).isoformat(),
-            session_id=str(uuid.uuid4())[:8],
+            timestamp=timestamp,
+            session_id=session_id,
         )
@@ -0,0 +1,53 @@
+"""Shared fixtures for the test suite."""
+
+import types
+
+import pytest
+
+from context_engineering_dashboard.core import resource as resource_mod
+
+
+class FakeEncoding:
+    """Whitespace tokenizer standing in for a tiktoken encoding.
+
+    Each encode call is recorded in ``batches`` as the list of texts it was
+    given; each model resolved to this encoding is recorded in ``models``.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.models = []
+
+    @property
+    def encoded(self):
+        """All texts encoded so far, in order."""
+        return [text for batch in self.batches for text in batch]
+
+    def encode(self, text):
+        self.batches.append([text])
+        return text.split()
+
+    def encode_batch(self, texts, num_threads=1):
+        self.batches.append(list(texts))
+        return [text.split() for text in texts]
+
+
+@pytest.fixture
+def fake_encoding(monkeypatch):
+    """Count tokens through a FakeEncoding, with empty encoding and memo caches."""
+    encoding = FakeEncoding()
+
+    def _encoding_for_model(model):
+        encoding.models.append(model)
+        return encoding
+
+    monkeypatch.setattr(resource_mod, "HAS_TIKTOKEN", True)
+    monkeypatch.setattr(
+        resource_mod,
+        "tiktoken",
+        types.SimpleNamespace(encoding_for_model=_encoding_for_model),
+        raising=False,
+    )
+    monkeypatch.setattr(resource_mod, "_ENCODING_CACHE", {})
+    monkeypatch.setattr(resource_mod, "_COUNT_CACHE", resource_mod.OrderedDict())
+    return encoding
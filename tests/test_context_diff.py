@@ -159,3 +159,34 @@ def test_new_component():
     diff = ContextDiff(before=before, after=after)
     h = diff._repr_html_()
     assert "<svg" in h
+
+
+def test_unchanged_traces_render_placeholder():
+    diff = ContextDiff(before=_make_before(), after=_make_before())
+    h = diff._repr_html_()
+    assert "NO CHANGES" in h
+    assert "<path" not in h
+    assert "40,000 tokens" in h
+
+
+def test_groups_refresh_after_in_place_edits():
+    """Editing a trace's components in place is reflected on the next render."""
+    diff = ContextDiff(before=_make_before(), after=_make_after())
+    assert "23,000" in diff._repr_html_()
+
+    diff.after.components.append(ContextComponent("rag_2", ComponentType.RAG, "More", 2000))
+    diff.after.total_tokens = 25000
+    h = diff._repr_html_()
+    assert "25,000" in h
+    assert diff._groups()[1][ComponentType.RAG] == 12000
+
+    diff.after.components[0] = ContextComponent("sys_1", ComponentType.SYSTEM_PROMPT, "S", 3000)
+    diff.after.total_tokens = 24000
+    assert diff._groups()[1][ComponentType.SYSTEM_PROMPT] == 3000
+
+    # Field edits that leave the list, length and total untouched show too
+    diff.after.components[0].token_count = 2500
+    diff.after.components[0].type = ComponentType.USER_MESSAGE
+    after_groups = diff._groups()[1]
+    assert after_groups[ComponentType.USER_MESSAGE] == 2500
+    assert ComponentType.SYSTEM_PROMPT not in after_groups
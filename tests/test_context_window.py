@@ -106,6 +106,41 @@ def test_html_xss_escaping():
     assert "xss" in h
 
 
+def test_css_shared_across_instances():
+    """Every instance embeds the same class-scoped stylesheet."""
+    a = ContextWindow(trace=_make_trace())
+    b = ContextWindow(trace=_make_trace())
+    css = a._css()
+    assert ".ced-container .ced-component" in css
+    assert a._uid not in css
+    assert css is b._css()
+    assert css in b.to_html()
+
+
+def test_modal_skeleton_reused_across_renders():
+    """The modal skeleton is built once per uid."""
+    ctx = ContextWindow(trace=_make_trace())
+    assert ctx._modal_html(ctx._uid) is ctx._modal_html(ctx._uid)
+
+
+def test_js_has_no_unfilled_sentinels():
+    """The shared script is instance-independent; only the bootstrap differs."""
+    from context_engineering_dashboard.core import context_window as cw_mod
+
+    a = ContextWindow(trace=_make_trace())
+    b = ContextWindow(trace=_make_trace())
+    js = a._js(a._uid)
+    assert "__" + "UID__" not in js
+    assert "_MAP__" not in js
+    assert '"rag": "#00AA55"' in js
+    assert js.endswith(f"cedInit_{cw_mod._JS_VERSION}('{a._uid}');")
+    # Both page-wide globals carry the script version, so stale definitions
+    # left on the page by another package version are never reused
+    assert "window.cedInit " not in js and "window.__CED_MAPS " not in js
+    assert f"if (!window.cedInit_{cw_mod._JS_VERSION})" in js
+    assert js.replace(a._uid, b._uid) == b._js(b._uid)
+
+
 def test_unique_instance_ids():
     trace = _make_trace()
     c1 = ContextWindow(trace=trace)
@@ -120,11 +155,113 @@ def test_unique_instance_ids():
 def test_component_data_json():
     ctx = ContextWindow(trace=_make_trace())
     h = ctx.to_html()
-    assert f"cedData_{ctx._uid}" in h
+    assert f'id="ced-data-{ctx._uid}"' in h
     assert '"system_prompt"' in h
     assert '"rag"' in h
 
 
+def _json_blocks(script):
+    """Parse the application/json script blocks, keyed by element id."""
+    import json
+    import re
+
+    return {
+        m.group(1): json.loads(m.group(2))
+        for m in re.finditer(r'<script type="application/json" id="([^"]+)">(.*?)</script>', script)
+    }
+
+
+def test_component_data_json_roundtrips():
+    """The embedded component payload is valid JSON matching the components."""
+    ctx = ContextWindow(trace=_make_trace())
+    blocks = _json_blocks(ctx._component_data_script(ctx._uid))
+    data = blocks[f"ced-data-{ctx._uid}"]
+    assert list(data) == ["sys_1", "rag_1", "rag_2", "user_1"]
+    assert data["rag_1"] == ["rag", 8000, "8,000", {"chroma_score": 0.92, "source": "test.md"}]
+    assert data["sys_1"] == ["system_prompt", 2000, "2,000"]  # empty metadata omitted
+    contents = blocks[f"ced-content-{ctx._uid}"]
+    assert list(contents) == list(data)
+    assert contents["rag_1"] == "Document content here."
+
+
+def test_component_data_reencodes_only_changed_components():
+    """Unchanged components reuse their encoded JSON across renders."""
+    ctx = ContextWindow(trace=_make_trace())
+    ctx._component_data_script(ctx._uid)
+    before = dict(ctx._component_json)
+    ctx.apply_edit("rag_1", "Edited.")
+    script = ctx._component_data_script(ctx._uid)
+    assert "Edited." in script
+    assert ctx._component_json["sys_1"][1] is before["sys_1"][1]
+    assert ctx._component_json["sys_1"][2] is before["sys_1"][2]
+    assert ctx._component_json["rag_1"][2] is not before["rag_1"][2]
+
+
+def test_component_data_without_orjson(monkeypatch):
+    """The stdlib encoder produces the same payload when orjson is missing."""
+    from context_engineering_dashboard.core import context_window as cw_mod
+
+    ctx = ContextWindow(trace=_make_trace())
+    with_orjson = _json_blocks(ctx._component_data_script(ctx._uid))
+    monkeypatch.setattr(cw_mod, "HAS_ORJSON", False)
+    ctx = ContextWindow(trace=_make_trace())
+    without = _json_blocks(ctx._component_data_script(ctx._uid))
+    assert list(without.values()) == list(with_orjson.values())
+
+
+def test_component_data_writes_nan_as_null(monkeypatch):
+    """Non-finite scores and metadata are embedded as null, with or without orjson."""
+    import math
+
+    from context_engineering_dashboard.core import context_window as cw_mod
+    from context_engineering_dashboard.core.resource import (
+        ContextResource,
+        ResourceItem,
+        ResourceType,
+    )
+
+    for has_orjson in (cw_mod.HAS_ORJSON, False):
+        monkeypatch.setattr(cw_mod, "HAS_ORJSON", has_orjson)
+        rag = ContextResource(
+            name="Docs",
+            resource_type=ResourceType.RAG,
+            items=[ResourceItem(id="d1", content="Doc 1", token_count=10, score=math.nan)],
+        )
+        trace = _make_trace()
+        trace.components[1].metadata["chroma_score"] = math.inf
+        ctx = ContextWindow(trace=trace, resources=[rag])
+        script = ctx._component_data_script(ctx._uid)
+        assert "NaN" not in script and "Infinity" not in script
+        blocks = _json_blocks(script)
+        assert blocks[f"ced-data-{ctx._uid}"]["rag_1"][3]["chroma_score"] is None
+        assert blocks[f"ced-resources-{ctx._uid}"]["Docs"]["items"][0]["score"] is None
+
+
+def test_layout_divs_rebuilt_only_for_changed_components():
+    """Unchanged components reuse their rendered div across renders."""
+    ctx = ContextWindow(trace=_make_trace())
+    first = ctx.to_html()
+    before = dict(ctx._div_cache)
+    ctx.trace.components[1].token_count = 9000
+    second = ctx.to_html()
+    assert ctx._div_cache["sys_1"][1] is before["sys_1"][1]
+    assert ctx._div_cache["rag_1"][1] is not before["rag_1"][1]
+    assert "9,000" in second and "9,000" not in first
+
+
+def test_component_data_cannot_close_script():
+    """Markup in content stays inside the JSON block and still decodes."""
+    components = [
+        ContextComponent("c1", ComponentType.USER_MESSAGE, "a </script><!-- b", 5),
+    ]
+    trace = ContextTrace(context_limit=1000, components=components, total_tokens=5)
+    ctx = ContextWindow(trace=trace)
+    script = ctx._component_data_script(ctx._uid)
+    assert script.count("</script>") == 3
+    contents = _json_blocks(script)[f"ced-content-{ctx._uid}"]
+    assert contents["c1"] == "a </script><!-- b"
+
+
 def test_legend_present():
     ctx = ContextWindow(trace=_make_trace())
     h = ctx.to_html()
@@ -195,6 +332,41 @@ def test_get_trace_returns_copy():
     assert returned_trace is not builder._working_trace
     assert returned_trace.components is not builder._working_trace.components
 
+    # Mutating the copy must not leak back into the builder
+    returned_trace.components[1].content = "changed"
+    returned_trace.components[1].metadata["source"] = "changed"
+    returned_trace.components.pop()
+    assert builder._working_trace.components[1].content == "Document content here."
+    assert builder._working_trace.components[1].metadata["source"] == "test.md"
+    assert len(builder._working_trace.components) == len(trace.components)
+
+
+def test_get_trace_isolates_call_and_embedding_traces():
+    """Mutating a returned trace's LLM call or embeddings never reaches the builder."""
+    from context_engineering_dashboard import ContextBuilder
+    from context_engineering_dashboard.core.trace import EmbeddingTrace, ToolCall, Trace
+
+    trace = _make_trace()
+    trace.trace = Trace(
+        messages=[{"role": "user", "content": "hi"}],
+        tool_calls=[ToolCall(name="search", arguments={"filters": {"k": 1}})],
+    )
+    trace.embedding_traces = [EmbeddingTrace("openai", "m", "hi", [0.1, 0.2])]
+    builder = ContextBuilder(trace=trace)
+
+    returned = builder.get_trace()
+    returned.trace.messages[0]["content"] = "changed"
+    returned.trace.messages.append({"role": "user", "content": "extra"})
+    returned.trace.tool_calls[0].arguments["filters"]["k"] = 2
+    returned.embedding_traces[0].embedding.append(0.3)
+
+    for source in (builder.get_trace(), trace):
+        assert source.trace.messages == [{"role": "user", "content": "hi"}]
+        assert source.trace.tool_calls[0].arguments == {"filters": {"k": 1}}
+        assert source.embedding_traces[0].embedding == [0.1, 0.2]
+    builder.reset()
+    assert builder.get_trace().trace.messages == [{"role": "user", "content": "hi"}]
+
 
 def test_apply_edit_updates_content():
     """apply_edit() should update the component content."""
@@ -233,6 +405,36 @@ def test_apply_edit_recounts_tokens():
     assert builder._working_trace.total_tokens != original_total
 
 
+def test_apply_edit_counts_through_resource_count_tokens(fake_encoding):
+    """Edits share count_tokens' encoding and memo table with resources."""
+    from context_engineering_dashboard import ContextBuilder
+    from context_engineering_dashboard.core import resource as resource_mod
+
+    builder = ContextBuilder(trace=_make_trace())
+    builder.apply_edit("sys_1", "one two three")
+    builder.apply_edit("user_1", "one two three")
+    assert resource_mod.count_tokens("one two three") == 3
+
+    assert fake_encoding.models == ["gpt-4"]
+    assert fake_encoding.encoded == ["one two three"]
+    assert builder._edits["user_1"]["new_tokens"] == 3
+
+
+def test_count_tokens_without_tiktoken(monkeypatch):
+    """Without tiktoken the builder estimates tokens without touching the encoder."""
+    from context_engineering_dashboard import ContextBuilder
+    from context_engineering_dashboard.core import resource as resource_mod
+
+    def _fail(model):
+        raise AssertionError("encoder should not be requested")
+
+    monkeypatch.setattr(resource_mod, "HAS_TIKTOKEN", False)
+    monkeypatch.setattr(resource_mod, "_get_encoding", _fail)
+
+    builder = ContextBuilder(trace=_make_trace())
+    assert builder._count_tokens("x" * 40) == 10
+
+
 def test_apply_edit_raises_on_missing_id():
     """apply_edit() should raise KeyError for unknown component ID."""
     from context_engineering_dashboard import ContextBuilder
@@ -247,6 +449,26 @@ def test_apply_edit_raises_on_missing_id():
         assert "nonexistent_id" in str(e)
 
 
+def test_apply_edit_after_external_component_change():
+    """apply_edit() should find components even if the list was changed directly."""
+    from context_engineering_dashboard import ContextBuilder
+
+    builder = ContextBuilder(trace=_make_trace())
+    builder.apply_edit("user_1", "first")
+
+    builder.trace.components.reverse()
+    builder.trace.components.append(
+        ContextComponent("extra", ComponentType.TOOL, "tool output", 10)
+    )
+    builder.apply_edit("user_1", "second")
+    builder.apply_edit("extra", "edited")
+
+    comps = {c.id: c for c in builder.trace.components}
+    assert comps["user_1"].content == "second"
+    assert comps["extra"].content == "edited"
+    assert builder.trace.components[0].id == "user_1"
+
+
 def test_apply_reorder_changes_order():
     """apply_reorder() should reorder components."""
     from context_engineering_dashboard import ContextBuilder
@@ -266,6 +488,17 @@ def test_apply_reorder_changes_order():
     assert reordered_ids == new_order
 
 
+def test_apply_reorder_keeps_unlisted_components():
+    """Components missing from new_order are appended in their current order."""
+    from context_engineering_dashboard import ContextBuilder
+
+    builder = ContextBuilder(trace=_make_trace())
+    builder.apply_reorder(["user_1", "unknown", "rag_1"])
+
+    ids = [c.id for c in builder._working_trace.components]
+    assert ids == ["user_1", "rag_1", "sys_1", "rag_2"]
+
+
 def test_has_changes_after_edit():
     """has_changes() should return True after editing."""
     from context_engineering_dashboard import ContextBuilder
@@ -322,6 +555,18 @@ def test_reset_clears_edits():
     assert ids == ["sys_1", "rag_1", "rag_2", "user_1"]
 
 
+def test_reset_discards_changes_made_through_trace():
+    """reset() also undoes mutations made directly on the trace property."""
+    from context_engineering_dashboard import ContextBuilder
+
+    builder = ContextBuilder(trace=_make_trace())
+    builder.trace.components[0].content = "Changed in place"
+    builder.trace.components.pop()
+    builder.reset()
+    assert builder.trace.components[0].content == "You are a helpful assistant."
+    assert len(builder.trace.components) == len(_make_trace().components)
+
+
 def test_trace_property_returns_working_trace():
     """trace property should return the working trace (backward compat)."""
     from context_engineering_dashboard import ContextBuilder
@@ -341,10 +586,13 @@ def test_html_contains_context_builder_label():
 
 def test_state_retrieval_function_present():
     """JavaScript should include cedGetState function."""
+    from context_engineering_dashboard.core import context_window as cw_mod
+
     ctx = ContextWindow(trace=_make_trace())
     h = ctx.to_html()
     uid = ctx._uid
-    assert f"cedGetState_{uid}" in h
+    assert "window['cedGetState_' + uid]" in h
+    assert f"cedInit_{cw_mod._JS_VERSION}('{uid}')" in h
 
 
 def test_save_stores_edit_in_data_attribute():
@@ -353,3 +601,34 @@ def test_save_stores_edit_in_data_attribute():
     h = ctx.to_html()
     assert "data-edits" in h
     assert "data-has-changes" in h
+
+
+def test_resources_panel_token_total():
+    """Context panel header totals selected resource items plus other components."""
+    from context_engineering_dashboard import ContextBuilder
+    from context_engineering_dashboard.core.resource import (
+        ContextResource,
+        ResourceItem,
+        ResourceType,
+    )
+
+    rag = ContextResource(
+        name="Docs",
+        resource_type=ResourceType.RAG,
+        items=[
+            ResourceItem(id="d1", content="Doc 1", token_count=1000, score=0.9),
+            ResourceItem(id="d2", content="Doc 2", token_count=500, score=0.5),
+        ],
+    )
+    rag.select(["d1"])
+    trace = ContextTrace(
+        context_limit=10_000,
+        components=[
+            ContextComponent("sys_1", ComponentType.SYSTEM_PROMPT, "Be helpful.", 1500),
+        ],
+        total_tokens=1500,
+    )
+    builder = ContextBuilder(trace=trace, context_limit=10_000, resources=[rag])
+    h = builder.to_html()
+    assert "2,500 / 10,000 TOKENS (25%)" in h
+    assert 'data-item-id="d2"' in h
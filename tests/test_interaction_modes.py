@@ -48,8 +48,8 @@ def test_tooltip_on_hover():
     """Hover shows tooltip with component type and tokens."""
     ctx = ContextWindow(trace=_make_trace())
     h = ctx.to_html()
-    assert "mouseenter" in h
-    assert "mouseleave" in h
+    assert "addEventListener('mouseover'" in h
+    assert "addEventListener('mouseout'" in h
     assert "ced-tooltip" in h
     assert "TOKENS" in h
 
@@ -92,7 +92,7 @@ def test_component_data_js_object():
     ctx = ContextWindow(trace=_make_trace())
     h = ctx.to_html()
     uid = ctx._uid
-    assert f"cedData_{uid}" in h
+    assert f'id="ced-data-{uid}"' in h
     assert '"sys_1"' in h
     assert '"rag_1"' in h
     assert '"system_prompt"' in h
@@ -106,6 +106,24 @@ class TestLangChainTracer:
         assert trace.timestamp != ""
         assert trace.session_id != ""
 
+    def test_stamp_taken_from_last_llm_start(self):
+        """Each LLM call is stamped when it starts; the trace uses the last one."""
+        stamps = [("2026-01-01T00:00:00", "first"), ("2026-01-01T00:01:00", "second")]
+        tracer = LangChainTracer()
+        with patch(
+            "context_engineering_dashboard.tracers.langchain_tracer.capture_stamp",
+            side_effect=stamps,
+        ):
+            with tracer:
+                handler = tracer.handler
+                for prompt in ("one", "two"):
+                    handler.on_llm_start({"name": "gpt-4o"}, [prompt])
+                    handler.on_llm_end(_MockLLMResult([[_MockGeneration("ok")]]))
+
+        trace = tracer.result
+        assert (trace.timestamp, trace.session_id) == stamps[1]
+        assert trace.trace.session_id == "second"
+
     def test_total_tokens_calculated(self):
         """Total tokens should be sum of component tokens."""
         tracer = LangChainTracer()
@@ -316,6 +316,18 @@ class TestLiteLLMTracer:
         assert trace.timestamp != ""
         assert trace.session_id != ""
 
+    def test_stamp_fixed_at_capture(self):
+        tracer = LiteLLMTracer()
+        messages = [{"role": "user", "content": "Hi"}]
+
+        tracer._capture({"model": "gpt-4o", "messages": messages}, _mock_response(), 50.0)
+        first = tracer._build_trace(tracer._captures[-1])
+        second = tracer._build_trace(tracer._captures[-1])
+
+        assert first.timestamp == second.timestamp
+        assert first.session_id == second.session_id
+        assert first.trace.session_id == first.session_id
+
     def test_model_stored_in_trace(self):
         tracer = LiteLLMTracer()
         messages = [{"role": "user", "content": "Hi"}]
@@ -150,6 +150,11 @@ def test_context_resource_to_components():
     for comp in components:
         assert comp.type == ComponentType.RAG
 
+    # Content is shared by reference; item metadata is left untouched
+    assert components[0].content is items[0].content
+    assert components[0].metadata == {"resource": "Docs", "score": 0.9}
+    assert items[0].metadata == {}
+
 
 def test_context_resource_from_items():
     """ContextResource.from_items factory method works."""
@@ -170,6 +175,31 @@ def test_context_resource_from_items():
     assert resource.items[1].score == 0.9
 
 
+def test_context_resource_from_items_batches_missing_counts(monkeypatch):
+    """from_items counts only items without a token_count, in one batch."""
+    from context_engineering_dashboard.core import resource as resource_mod
+
+    batches = []
+
+    def _fake_batch(texts, model="gpt-4"):
+        batches.append(list(texts))
+        return [len(text) for text in texts]
+
+    monkeypatch.setattr(resource_mod, "count_tokens_batch", _fake_batch)
+    resource = ContextResource.from_items(
+        [
+            {"id": "a", "content": "abc"},
+            {"id": "b", "content": "unused", "token_count": 10},
+            {"id": "c", "content": "de"},
+        ],
+        ResourceType.EXAMPLE,
+        "Examples",
+    )
+
+    assert batches == [["abc", "de"]]
+    assert [item.token_count for item in resource.items] == [3, 10, 2]
+
+
 def test_context_resource_selected_items_property():
     """ContextResource.selected_items returns only selected items."""
     items = [
@@ -205,3 +235,185 @@ def test_context_resource_total_selected_tokens():
 
     resource.select(["d1", "d3"])
     assert resource.total_selected_tokens == 40
+
+
+def test_count_tokens_caches_encoding(fake_encoding):
+    """count_tokens resolves each encoding once and memoizes repeated texts."""
+    from context_engineering_dashboard.core import resource as resource_mod
+
+    assert resource_mod.count_tokens("one two three", model="fake-model") == 3
+    assert resource_mod.count_tokens("four five", model="fake-model") == 2
+    assert resource_mod.count_tokens("four five", model="fake-model") == 2
+    assert fake_encoding.models == ["fake-model"]
+    assert fake_encoding.encoded == ["one two three", "four five"]
+
+
+def test_count_tokens_caches_long_texts_by_digest(fake_encoding, monkeypatch):
+    """Texts past _CACHE_MAX_CHARS are memoized without keeping the text."""
+    from context_engineering_dashboard.core import resource as resource_mod
+
+    monkeypatch.setattr(resource_mod, "_CACHE_MAX_CHARS", 10)
+
+    text = "word " * 10
+    assert resource_mod.count_tokens(text, model="fake-model") == 10
+    assert resource_mod.count_tokens(text, model="fake-model") == 10
+    assert fake_encoding.encoded == [text]
+    assert all(text not in key for key in resource_mod._COUNT_CACHE)
+
+
+def test_count_tokens_batch_encodes_only_misses(fake_encoding):
+    """count_tokens_batch shares the memo table and batch-encodes distinct misses."""
+    from context_engineering_dashboard.core import resource as resource_mod
+
+    assert resource_mod.count_tokens("a b", model="fake-model") == 2
+    counts = resource_mod.count_tokens_batch(["a b", "c", "d e f", "c"], model="fake-model")
+    assert counts == [2, 1, 3, 1]
+    assert resource_mod.count_tokens_batch(["c", "d e f"], model="fake-model") == [1, 3]
+    assert fake_encoding.batches == [["a b"], ["c", "d e f"]]
+
+
+class _FakeCollection:
+    """Minimal stand-in for a Chroma collection."""
+
+    name = "fake"
+
+    def __init__(self, results):
+        self._results = results
+
+    def query(self, **kwargs):
+        return self._results
+
+
+def test_context_resource_query_populates_items(monkeypatch):
+    """query() converts Chroma results into scored, token-counted items."""
+    from context_engineering_dashboard.core import resource as resource_mod
+
+    monkeypatch.setattr(resource_mod, "HAS_TIKTOKEN", False)
+    collection = _FakeCollection(
+        {
+            "ids": [["a", "b"]],
+            "documents": [["12345678", "1234"]],
+            "distances": [[0.0, 1.0]],
+            "metadatas": [[{"source": "a.md"}, None]],
+        }
+    )
+    resource = ContextResource.from_chroma(collection)
+    resource.query(query_texts=["q"], n_results=2)
+
+    assert [item.id for item in resource.items] == ["a", "b"]
+    assert [item.token_count for item in resource.items] == [2, 1]
+    assert [item.score for item in resource.items] == [1.0, 0.5]
+    assert resource.items[0].metadata == {"source": "a.md"}
+    assert resource.items[1].metadata == {}
+    assert sum(item.token_count for item in resource.items) == 3
+
+
+def test_token_count_cache_persists(tmp_path, fake_encoding):
+    """TokenCountCache stores counts on disk and reuses them across instances."""
+    from context_engineering_dashboard.core import resource as resource_mod
+
+    path = tmp_path / "tokens.sqlite"
+
+    cache = resource_mod.TokenCountCache(path)
+    assert cache.get("fake-model", "a b c") == 3
+    assert cache.get("fake-model", "a b c") == 3
+    cache.close()
+
+    reopened = resource_mod.TokenCountCache(path)
+    assert reopened.get("fake-model", "a b c") == 3
+    reopened.close()
+
+    assert fake_encoding.encoded == ["a b c"]
+
+
+def test_count_tokens_batch_uses_disk_cache(tmp_path, fake_encoding, monkeypatch):
+    """With ENABLE_DISK_CACHE, batches read stored counts and encode only misses."""
+    from context_engineering_dashboard.core import resource as resource_mod
+
+    monkeypatch.setattr(resource_mod, "ENABLE_DISK_CACHE", True)
+    disk = resource_mod.TokenCountCache(tmp_path / "tokens.sqlite")
+    monkeypatch.setattr(resource_mod, "_DISK_CACHE", disk)
+
+    assert disk.get("fake-model", "a b") == 2
+    counts = resource_mod.count_tokens_batch(["a b", "c", "d e f", "c"], model="fake-model")
+    assert counts == [2, 1, 3, 1]
+    assert fake_encoding.batches == [["a b"], ["c", "d e f"]]
+    assert disk.get_many("fake-model", ["d e f", "c"]) == [3, 1]
+    assert len(fake_encoding.batches) == 2
+    disk.close()
+
+
+def test_selected_items_follow_replaced_items():
+    """selected_items keeps pool order and tracks items being replaced."""
+    resource = ContextResource(
+        name="Docs",
+        resource_type=ResourceType.RAG,
+        items=[
+            ResourceItem(id="d1", content="Doc 1", token_count=10),
+            ResourceItem(id="d2", content="Doc 2", token_count=20),
+            ResourceItem(id="d3", content="Doc 3", token_count=30),
+        ],
+    )
+    resource.select(["d3", "d1"])
+    assert [item.id for item in resource.selected_items] == ["d1", "d3"]
+
+    resource.items = [ResourceItem(id="d3", content="New 3", token_count=5)]
+    assert [item.content for item in resource.selected_items] == ["New 3"]
+    assert resource.total_selected_tokens == 5
+
+
+def test_selected_items_follow_in_place_replacement():
+    """Replacing an element in place never surfaces an unselected item."""
+    resource = ContextResource(
+        name="Docs",
+        resource_type=ResourceType.RAG,
+        items=[
+            ResourceItem(id="a", content="A", token_count=1),
+            ResourceItem(id="b", content="B", token_count=2),
+        ],
+    )
+    resource.select(["b"])
+    assert [item.id for item in resource.selected_items] == ["b"]
+
+    resource.items[1] = ResourceItem(id="c", content="C", token_count=3)
+    assert resource.selected_items == []
+    assert resource.total_selected_tokens == 0
+
+    resource.items[0] = ResourceItem(id="b", content="B2", token_count=4)
+    resource.items.append(ResourceItem(id="b", content="B3", token_count=5))
+    assert [item.content for item in resource.selected_items] == ["B2", "B3"]
+    assert resource.total_selected_tokens == 9
+
+
+def test_distances_to_scores_matches_python_fallback(monkeypatch):
+    """Vectorized and pure-Python score conversion agree."""
+    from context_engineering_dashboard.core import resource as resource_mod
+
+    distances = [0.0, 1.0, 0.5, -2.0, 3.25]
+    vectorized = resource_mod._distances_to_scores(distances, 6)
+    monkeypatch.setattr(resource_mod, "np", None)
+    fallback = resource_mod._distances_to_scores(distances, 6)
+
+    assert vectorized == fallback == [1.0, 0.5, 0.6667, 1.0, 0.2353, 1.0]
+
+
+def test_items_by_score_tracks_item_changes():
+    """items_by_score reflects in-place score edits and element replacement."""
+    resource = ContextResource(
+        name="Docs",
+        resource_type=ResourceType.RAG,
+        items=[
+            ResourceItem(id="low", content="a", token_count=1, score=0.1),
+            ResourceItem(id="none", content="b", token_count=1),
+            ResourceItem(id="high", content="c", token_count=1, score=0.9),
+        ],
+    )
+    ordered = resource.items_by_score
+    assert [i.id for i in ordered] == ["high", "low", "none"]
+
+    ordered.reverse()
+    resource.items[0].score = 1.0
+    assert [i.id for i in resource.items_by_score] == ["low", "high", "none"]
+
+    resource.items[1] = ResourceItem(id="top", content="d", token_count=1, score=2.0)
+    assert [i.id for i in resource.items_by_score] == ["top", "low", "high"]
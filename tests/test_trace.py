@@ -4,6 +4,8 @@ import json
 import tempfile
 from pathlib import Path
 
+import pytest
+
 from context_engineering_dashboard.core.trace import (
     ComponentType,
     ContextComponent,
@@ -276,3 +278,79 @@ def test_to_json_from_json_string_path():
         assert restored.context_limit == 1000
     finally:
         Path(path).unlink(missing_ok=True)
+
+
+def test_to_json_same_data_without_orjson(tmp_path, monkeypatch):
+    """The stdlib fallback writes the same JSON data as the orjson path."""
+    from context_engineering_dashboard.core import trace as trace_mod
+
+    trace = ContextTrace(
+        context_limit=1000,
+        components=[ContextComponent("u1", ComponentType.USER_MESSAGE, "héllo ✓", 3)],
+        total_tokens=3,
+        trace=Trace(provider="openai", model="gpt-4o", latency_ms=12.5),
+    )
+    fast = tmp_path / "fast.json"
+    trace.to_json(fast)
+    monkeypatch.setattr(trace_mod, "HAS_ORJSON", False)
+    slow = tmp_path / "slow.json"
+    trace.to_json(slow)
+
+    assert json.loads(fast.read_bytes()) == json.loads(slow.read_bytes())
+    assert ContextTrace.from_json(slow).components[0].content == "héllo ✓"
+
+
+def test_validate_reuses_compiled_schema():
+    """The bundled schema is read and compiled once across validate calls."""
+    from context_engineering_dashboard.core import trace as trace_mod
+
+    trace_mod._get_trace_validator.cache_clear()
+    trace = Trace(provider="openai")
+    first = trace.validate()
+    assert trace.validate() == first
+    info = trace_mod._get_trace_validator.cache_info()
+    assert (info.misses, info.hits) == (1, 1)
+
+
+def test_record_types_use_slots():
+    """Per-item record types carry no per-instance __dict__."""
+    records = [
+        ContextComponent("c1", ComponentType.RAG, "Doc", 1),
+        ToolCall(name="search", arguments={}),
+        EmbeddingTrace(provider="openai", model="m", input_text="x", embedding=[0.1]),
+    ]
+    for record in records:
+        assert not hasattr(record, "__dict__")
+
+
+def test_to_json_writes_numpy_embeddings_as_lists(tmp_path, monkeypatch):
+    """numpy embeddings are written as JSON number arrays, with or without orjson."""
+    np = pytest.importorskip("numpy")
+    from context_engineering_dashboard.core import trace as trace_mod
+
+    embedding = np.array([0.5, -0.25, 1.0], dtype=np.float32)
+    trace = ContextTrace(
+        context_limit=1000,
+        components=[],
+        total_tokens=0,
+        embedding_traces=[EmbeddingTrace("openai", "m", "text", embedding)],
+    )
+    for has_orjson in (trace_mod.HAS_ORJSON, False):
+        monkeypatch.setattr(trace_mod, "HAS_ORJSON", has_orjson)
+        path = tmp_path / f"trace_{has_orjson}.json"
+        trace.to_json(path)
+        restored = ContextTrace.from_json(path)
+        assert restored.embedding_traces[0].embedding == [0.5, -0.25, 1.0]
+
+
+def test_embedding_trace_numpy_equality_and_dict():
+    """Array embeddings compare by value and come out of to_dict as lists."""
+    np = pytest.importorskip("numpy")
+
+    as_array = EmbeddingTrace("openai", "m", "text", np.array([0.5, 1.0]))
+    as_list = EmbeddingTrace("openai", "m", "text", [0.5, 1.0])
+    assert as_array == as_list
+    assert as_array != EmbeddingTrace("openai", "m", "text", np.array([0.5, 2.0]))
+    assert as_array.to_dict()["embedding"] == [0.5, 1.0]
+    assert type(as_array.to_dict()["embedding"]) is list
+    json.dumps(as_array.to_dict())